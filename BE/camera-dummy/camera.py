@@ -7,7 +7,6 @@ menggunakan protokol RTSP
 
 import cv2
 import os
-import glob
 import threading
 import time
 import logging
@@ -15,6 +14,11 @@ import argparse
 import subprocess
 import signal
 import sys
+import functools
+import operator
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 try:
     import numpy as np
@@ -28,52 +32,305 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _has_ffmpeg():
+    """Check (once) whether the ffmpeg binary is on PATH"""
+    return shutil.which('ffmpeg') is not None
+
+def _launch_ffmpeg(cmd):
+    """Start an ffmpeg command whose output is never read.
+
+    Arguments are chosen so CPython can take its posix_spawn fast path
+    (absolute executable, no close_fds / start_new_session / preexec_fn),
+    which avoids duplicating the page tables of this numpy/cv2-heavy process.
+    Python fds are non-inheritable by default, so close_fds is not needed.
+    """
+    executable = shutil.which(cmd[0]) or cmd[0]
+    # Kurangi output FFmpeg dari sumbernya; -nostdin supaya tidak membaca terminal
+    cmd = [executable, '-nostdin', '-loglevel', 'error', '-nostats'] + cmd[1:]
+    return subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=False
+    )
+
+# Urutan preferensi hardware encoder H.264
+HW_ENCODERS = ['h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_videotoolbox']
+
+def _hw_device_present(encoder):
+    """Check that the device behind a compiled-in FFmpeg HW encoder actually exists"""
+    try:
+        if encoder == 'h264_nvenc':
+            return subprocess.run(['nvidia-smi'], stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL).returncode == 0
+        if encoder in ('h264_qsv', 'h264_vaapi'):
+            return subprocess.run(['vainfo'], stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL).returncode == 0
+        if encoder == 'h264_videotoolbox':
+            return sys.platform == 'darwin'
+    except Exception:
+        pass
+    return False
+
+def detect_hw_encoder():
+    """Probe `ffmpeg -encoders` once and return the first usable HW H.264 encoder (or None)"""
+    try:
+        output = subprocess.check_output(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            stderr=subprocess.DEVNULL
+        ).decode('utf-8', errors='ignore')
+    except Exception:
+        return None
+
+    available = set()
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            available.add(parts[1])
+
+    for encoder in HW_ENCODERS:
+        if encoder in available and _hw_device_present(encoder):
+            return encoder
+    return None
+
+# tmpfs untuk cache sample video (lihat --shm-cache)
+SHM_DIR = '/dev/shm'
+
+# Ekstensi file video yang dikenali di folder samples
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv'}
+
+def _natural_key(name):
+    """Sort key that orders embedded numbers numerically (2.mp4 before 10.mp4)"""
+    return [(0, int(token), '') if token.isdigit() else (1, 0, token.lower())
+            for token in re.split(r'(\d+)', name)]
+
+# Codec yang bisa langsung di-stream ke RTSP tanpa re-encode
+RTSP_COPY_CODECS = {'h264', 'hevc'}
+
+@functools.lru_cache(maxsize=None)
+def _probe_codec(path):
+    """Return the codec name of the first video stream (cached per path), or None"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', path],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        if result.returncode == 0:
+            return result.stdout.decode('ascii', errors='ignore').strip().lower() or None
+    except Exception:
+        pass
+    return None
+
+class FFmpegPipeWriter:
+    """Minimal cv2.VideoWriter-compatible writer that pipes raw BGR frames to ffmpeg (libx264)"""
+    def __init__(self, path, fps, size):
+        width, height = size
+        cmd = [
+            shutil.which('ffmpeg') or 'ffmpeg',
+            '-y', '-loglevel', 'error', '-nostats',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}',
+            '-r', str(fps),
+            '-i', '-',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-pix_fmt', 'yuv420p',
+            path
+        ]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def write(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+def _open_capture(video_path):
+    """Open a cv2.VideoCapture with the FFmpeg backend and a 1-frame internal buffer"""
+    # Paksa backend FFmpeg dan buffer internal minimal (1 frame)
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+class SharedDecoder:
+    """Decode one video file in a single thread and share the latest frame.
+
+    Cameras that reuse the same sample subscribe to one decoder instead of
+    each opening (and decoding) their own VideoCapture.
+    """
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.fps = 30
+        self.latest = None
+        self.thread = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop_evt = threading.Event()
+
+    def start(self):
+        """Open the video and start the decode thread; returns False if it cannot be opened"""
+        cap = _open_capture(self.video_path)
+        if not cap.isOpened():
+            logger.error(f"Cannot open video file: {self.video_path}")
+            return False
+
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        self.fps = fps if fps > 0 else 30
+        self.thread = threading.Thread(target=self._run, args=(cap,), daemon=True)
+        self.thread.start()
+        logger.info(f"Shared decoder started for {os.path.basename(self.video_path)} ({self.fps} FPS)")
+        return True
+
+    def _run(self, cap):
+        frame_delay = 1.0 / self.fps
+        next_deadline = time.monotonic()
+        while not self._stop_evt.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                # Restart video from beginning
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+
+            with self._lock:
+                self.latest = frame
+            self._ready.set()
+
+            next_deadline += frame_delay
+            now = time.monotonic()
+            if now < next_deadline:
+                self._stop_evt.wait(next_deadline - now)
+            else:
+                next_deadline = now
+        cap.release()
+
+    def read(self, timeout=1.0):
+        """Return a private copy of the latest decoded frame (None if none yet)"""
+        if not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            frame = self.latest
+        return frame.copy()
+
+    def stop(self):
+        self._stop_evt.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+
 class RTSPCameraDummy:
-    def __init__(self, video_path, camera_id, rtsp_port=8554, max_fps=None, rtsp_host='localhost'):
+    def __init__(self, video_path, camera_id, rtsp_port=8554, max_fps=None, rtsp_host='localhost',
+                 hw_encoder=None, realtime_input=True, decoder=None, threads=None):
         self.video_path = video_path
         self.camera_id = camera_id
+        # String identitas kamera di-format sekali saja
+        self._cam_tag = f"cam{int(camera_id):02d}"
+        self._cam_label = f"Camera {camera_id}"
         self.rtsp_port = rtsp_port
         self.rtsp_host = rtsp_host
+        # HW encoder hasil probe CameraDummyManager (None = libx264)
+        self.hw_encoder = hw_encoder
+        # Jika False dan max_fps di-set, '-re' tidak dipakai (pacing diserahkan ke '-r')
+        self.realtime_input = realtime_input
+        # SharedDecoder milik manager untuk mode OpenCV (None = buka VideoCapture sendiri)
+        self.decoder = decoder
+        # Jumlah thread encoder FFmpeg untuk kamera ini (None = default ffmpeg/auto)
+        self.threads = threads
         # Optional maximum FPS cap for this camera (None = no cap)
         self.max_fps = max_fps
         self.running = False
         self.thread = None
         self.process = None
+        # Overlay teks di-render sekali lalu di-blit ke setiap frame (lihat start_opencv_streaming)
+        self._id_overlay = None
+        self._ts_overlay = None
+        self._last_ts_sec = None
+        if np is not None:
+            self._id_overlay = self._render_text_overlay(self._cam_label, 1, (0, 255, 0), 2)
+
+    @staticmethod
+    def _render_text_overlay(text, font_scale, color, thickness):
+        """Render text once into a small patch + mask so it can be blitted per frame"""
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        (text_w, text_h), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+        pad = thickness
+        patch = np.zeros((text_h + baseline + 2 * pad, text_w + 2 * pad, 3), dtype=np.uint8)
+        cv2.putText(patch, text, (pad, text_h + pad), font, font_scale, color, thickness)
+        # Mask uint8 supaya blit bisa lewat cv2.copyTo (C++, GIL dilepas)
+        mask = patch.any(axis=2).astype(np.uint8)
+        # (patch, mask, offset dari titik origin putText ke pojok kiri atas patch)
+        return patch, mask, (pad, text_h + pad)
+
+    @staticmethod
+    def _blit_overlay(frame, overlay, org):
+        """Copy a pre-rendered text overlay onto frame at putText-style origin"""
+        patch, mask, (off_x, off_y) = overlay
+        x0 = org[0] - off_x
+        y0 = org[1] - off_y
+        # Clip ke batas frame
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1 = min(x0 + patch.shape[1], frame.shape[1])
+        fy1 = min(y0 + patch.shape[0], frame.shape[0])
+        if fx1 <= fx0 or fy1 <= fy0:
+            return
+        px0, py0 = fx0 - x0, fy0 - y0
+        px1, py1 = px0 + (fx1 - fx0), py0 + (fy1 - fy0)
+        roi = frame[fy0:fy1, fx0:fx1]
+        # cv2.copyTo menulis langsung ke view roi dan melepas GIL selama copy,
+        # sehingga loop beberapa kamera bisa jalan paralel
+        cv2.copyTo(patch[py0:py1, px0:px1], mask[py0:py1, px0:px1], roi)
         
+    @property
+    def rtsp_url(self):
+        """RTSP URL untuk kamera ini (use consistent /camXX path)"""
+        return f"rtsp://{self.rtsp_host}:{self.rtsp_port}/{self._cam_tag}"
+
     def start_rtsp_server(self):
         """Start RTSP server using FFmpeg"""
         try:
-            # RTSP URL untuk kamera ini (use consistent /camXX path)
-            rtsp_url = f"rtsp://{self.rtsp_host}:{self.rtsp_port}/cam{int(self.camera_id):02d}"
+            rtsp_url = self.rtsp_url
             
-            # Pilih encoder sesuai environment
-            encoder = 'libx264'  # Default CPU
-            preset = 'ultrafast'
-            tune = 'zerolatency'
-            # Deteksi NVIDIA GPU
-            try:
-                gpu_info = subprocess.run(['nvidia-smi'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                if gpu_info.returncode == 0:
-                    encoder = 'h264_nvenc'
-                    preset = 'llhp'
-                    tune = None
-            except Exception:
-                pass
-            # Deteksi Intel QuickSync/VAAPI
+            # Jika source sudah H.264/HEVC dan tidak perlu ubah FPS, cukup stream copy (tanpa decode+encode)
+            codec = _probe_codec(self.video_path) if self.max_fps is None else None
+            if codec in RTSP_COPY_CODECS:
+                cmd = [
+                    'ffmpeg',
+                    '-re',
+                    '-stream_loop', '-1',
+                    '-i', self.video_path,
+                    '-c', 'copy',
+                    '-f', 'rtsp',
+                    rtsp_url
+                ]
+                logger.info(f"Camera {self.camera_id}: source is {codec}, using stream copy")
+                return self._spawn_ffmpeg(cmd, rtsp_url)
+
+            # Pilih encoder sesuai environment (sudah di-probe sekali oleh manager)
+            encoder = self.hw_encoder or 'libx264'
+            preset = None
+            tune = None
             if encoder == 'libx264':
-                try:
-                    vaapi_info = subprocess.run(['vainfo'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    if vaapi_info.returncode == 0:
-                        encoder = 'h264_vaapi'
-                        preset = None
-                        tune = None
-                except Exception:
-                    pass
+                preset = 'ultrafast'
+                tune = 'zerolatency'
+            elif encoder == 'h264_nvenc':
+                preset = 'llhp'
+            # '-re' membuat ffmpeg sleep per frame untuk mengikuti frame rate input
+            input_rate = ['-re']  # Read input at native frame rate
+            if self.max_fps is not None and not self.realtime_input:
+                input_rate = []
+                logger.info(f"Camera {self.camera_id}: -re disabled, output pacing relies on -r and the RTSP server "
+                            f"(fewer timer wakeups, but ffmpeg may publish faster than real time)")
             # Command FFmpeg untuk streaming RTSP
-            cmd = [
-                'ffmpeg',
-                '-re',  # Read input at native frame rate
+            cmd = ['ffmpeg'] + input_rate + [
                 '-stream_loop', '-1',  # Loop infinitely
+            ]
+            if encoder != 'libx264':
+                cmd += ['-hwaccel', 'auto']
+            cmd += [
                 '-i', self.video_path,  # Input video file
                 '-c:v', encoder,
             ]
@@ -81,11 +338,11 @@ class RTSPCameraDummy:
                 cmd += ['-preset', preset]
             if tune:
                 cmd += ['-tune', tune]
+            if encoder == 'h264_qsv':
+                cmd += ['-pix_fmt', 'nv12']
             # VAAPI membutuhkan opsi tambahan
             if encoder == 'h264_vaapi':
-                cmd = [
-                    'ffmpeg',
-                    '-re',
+                cmd = ['ffmpeg'] + input_rate + [
                     '-stream_loop', '-1',
                     '-hwaccel', 'vaapi',
                     '-hwaccel_device', '/dev/dri/renderD128',
@@ -93,7 +350,9 @@ class RTSPCameraDummy:
                     '-vf', 'format=nv12,hwupload',
                     '-c:v', 'h264_vaapi',
                 ]
-            # ...existing code...
+            # Batasi thread encoder supaya total thread semua kamera ~ jumlah CPU
+            if self.threads:
+                cmd += ['-threads', str(self.threads), '-thread_type', 'slice']
 
             # If a max_fps limit is provided, request ffmpeg to output at that rate
             if self.max_fps is not None:
@@ -110,28 +369,88 @@ class RTSPCameraDummy:
                 rtsp_url  # Output RTSP URL
             ]
             
-            logger.info(f"Starting RTSP server for camera {self.camera_id}")
-            logger.info(f"Video: {os.path.basename(self.video_path)}")
-            logger.info(f"RTSP URL: {rtsp_url}")
-            
-            # Start FFmpeg process
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            return rtsp_url
+            return self._spawn_ffmpeg(cmd, rtsp_url)
             
         except Exception as e:
             logger.error(f"Error starting RTSP server for camera {self.camera_id}: {e}")
             return None
+
+    def _spawn_ffmpeg(self, cmd, rtsp_url):
+        """Launch the FFmpeg streaming process for this camera"""
+        logger.info(f"Starting RTSP server for camera {self.camera_id}")
+        logger.info(f"Video: {os.path.basename(self.video_path)}")
+        logger.info(f"RTSP URL: {rtsp_url}")
+        
+        # Start FFmpeg process - output ke DEVNULL supaya pipe tidak penuh dan memblok ffmpeg
+        self.process = _launch_ffmpeg(cmd)
+        
+        return rtsp_url
     
+    def _effective_fps(self, fps):
+        """Determine effective FPS considering optional max_fps"""
+        effective_fps = fps
+        if self.max_fps is not None:
+            try:
+                mf = int(self.max_fps)
+                if mf > 0:
+                    effective_fps = min(fps, mf)
+                    logger.info(f"Camera {self.camera_id} effective FPS capped to {effective_fps} (source: {fps})")
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid max_fps value: {self.max_fps}")
+        return effective_fps
+
+    def _draw_overlay(self, frame):
+        """Draw camera ID and timestamp onto frame in place"""
+        if self._id_overlay is not None:
+            # Add camera ID overlay (pre-rendered di __init__)
+            self._blit_overlay(frame, self._id_overlay, (10, 30))
+
+            # Add timestamp - hanya di-render ulang saat detik yang ditampilkan berubah
+            now_sec = int(time.time())
+            if now_sec != self._last_ts_sec:
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_sec))
+                self._ts_overlay = self._render_text_overlay(timestamp, 0.5, (255, 255, 255), 1)
+                self._last_ts_sec = now_sec
+            self._blit_overlay(frame, self._ts_overlay, (10, frame.shape[0] - 10))
+        else:
+            cv2.putText(frame, self._cam_label, (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            cv2.putText(frame, timestamp, (10, frame.shape[0] - 10), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    def _stream_from_shared_decoder(self):
+        """OpenCV streaming loop fed by a SharedDecoder instead of a private VideoCapture"""
+        effective_fps = self._effective_fps(self.decoder.fps)
+        frame_delay = 1.0 / effective_fps
+
+        logger.info(f"Camera {self.camera_id} streaming started (shared decoder) - "
+                    f"source FPS: {self.decoder.fps}, effective FPS: {effective_fps}")
+
+        next_deadline = time.monotonic()
+        while self.running:
+            frame = self.decoder.read()
+            if frame is None:
+                continue
+
+            self._draw_overlay(frame)
+
+            next_deadline += frame_delay
+            now = time.monotonic()
+            if now < next_deadline:
+                time.sleep(next_deadline - now)
+            else:
+                # Decoder selalu menyimpan frame terbaru, jadi cukup reset deadline
+                next_deadline = now
+
     def start_opencv_streaming(self):
         """Alternative method using OpenCV for streaming"""
         try:
-            cap = cv2.VideoCapture(self.video_path)
+            if self.decoder is not None:
+                self._stream_from_shared_decoder()
+                return
+
+            cap = _open_capture(self.video_path)
             
             if not cap.isOpened():
                 logger.error(f"Cannot open video file: {self.video_path}")
@@ -142,21 +461,13 @@ class RTSPCameraDummy:
             if fps <= 0:
                 fps = 30
 
-            # Determine effective FPS considering optional max_fps
-            effective_fps = fps
-            if self.max_fps is not None:
-                try:
-                    mf = int(self.max_fps)
-                    if mf > 0:
-                        effective_fps = min(fps, mf)
-                        logger.info(f"Camera {self.camera_id} effective FPS capped to {effective_fps} (source: {fps})")
-                except (TypeError, ValueError):
-                    logger.warning(f"Invalid max_fps value: {self.max_fps}")
-
+            effective_fps = self._effective_fps(fps)
             frame_delay = 1.0 / effective_fps
 
             logger.info(f"Camera {self.camera_id} streaming started - source FPS: {fps}, effective FPS: {effective_fps}")
             
+            # Deadline-based pacing pakai clock monotonic supaya tidak drift
+            next_deadline = time.monotonic()
             while self.running:
                 ret, frame = cap.read()
                 
@@ -165,18 +476,20 @@ class RTSPCameraDummy:
                     cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
                     continue
                 
-                # Add camera ID overlay
-                cv2.putText(frame, f"Camera {self.camera_id}", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                
-                # Add timestamp
-                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                cv2.putText(frame, timestamp, (10, frame.shape[0] - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                self._draw_overlay(frame)
                 
                 # Here you would typically send the frame to RTSP server
                 # For now, we'll just simulate the streaming
-                time.sleep(frame_delay)
+                next_deadline += frame_delay
+                now = time.monotonic()
+                if now < next_deadline:
+                    time.sleep(next_deadline - now)
+                else:
+                    # Tertinggal: lewati frame dengan grab() (tanpa decode) sampai kembali on-schedule
+                    while now - next_deadline > frame_delay:
+                        if not cap.grab():
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        next_deadline += frame_delay
             
             cap.release()
             
@@ -193,7 +506,7 @@ class RTSPCameraDummy:
             self.thread = threading.Thread(target=self.start_opencv_streaming)
             self.thread.daemon = True
             self.thread.start()
-            return f"opencv://cam{int(self.camera_id):02d}"
+            return f"opencv://{self._cam_tag}"
     
     def stop(self):
         """Stop the camera streaming"""
@@ -212,11 +525,19 @@ class RTSPCameraDummy:
         logger.info(f"Camera {self.camera_id} stopped")
 
 class CameraDummyManager:
-    def __init__(self, samples_dir="./samples", base_port=8554, max_fps=None, rtsp_server=None):
+    def __init__(self, samples_dir="./samples", base_port=8554, max_fps=None, rtsp_server=None,
+                 shared_ffmpeg=False, realtime_input=True, shm_cache=False):
         self.samples_dir = samples_dir
         self.base_port = base_port
         # Optional global cap for camera output FPS
         self.max_fps = max_fps
+        # Satu proses FFmpeg untuk semua kamera (hanya bila semua source bisa di-stream copy)
+        self.shared_ffmpeg = shared_ffmpeg
+        # Pakai '-re' walaupun max_fps di-set (default True)
+        self.realtime_input = realtime_input
+        # Copy sample videos ke tmpfs (/dev/shm) sebelum streaming
+        self.shm_cache = shm_cache
+        self.shared_process = None
         # RTSP server host:port (if provided as env var RTSP_SERVER)
         # Expected format: host:port or rtsp://host:port
         self.rtsp_server = rtsp_server or os.getenv('RTSP_SERVER', None)
@@ -237,24 +558,41 @@ class CameraDummyManager:
             else:
                 self.rtsp_host = server
                 self.rtsp_port = self.base_port
+        # Probe hardware encoder sekali untuk semua kamera
+        self.has_ffmpeg = _has_ffmpeg()
+        self.hw_encoder = detect_hw_encoder() if self.has_ffmpeg else None
+        if self.hw_encoder:
+            logger.info(f"Using hardware H.264 encoder: {self.hw_encoder}")
+        elif self.has_ffmpeg:
+            logger.info("No hardware H.264 encoder found, using libx264")
         self.cameras = []
+        # Satu SharedDecoder per file video unik (mode OpenCV)
+        self._decoders = {}
         self.running = False
+        # Di-set oleh signal handler / stop_all_cameras untuk membangunkan run()
+        self._stop_evt = threading.Event()
+        # True hanya selama run() menunggu _stop_evt; di luar itu signal langsung menghentikan proses
+        self._waiting = False
         
     def discover_video_files(self):
         """Discover video files in samples directory"""
-        video_extensions = ['*.mp4', '*.avi', '*.mov', '*.mkv', '*.wmv', '*.flv']
         video_files = []
         
         if not os.path.exists(self.samples_dir):
             logger.warning(f"Samples directory not found: {self.samples_dir}")
             return video_files
         
-        for ext in video_extensions:
-            pattern = os.path.join(self.samples_dir, ext)
-            video_files.extend(glob.glob(pattern))
+        # Satu kali scan direktori, filter berdasarkan ekstensi
+        with os.scandir(self.samples_dir) as entries:
+            video_files = [
+                entry.path for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS
+            ]
         
-        # Sort files naturally (1.mp4, 2.mp4, etc.)
-        video_files.sort(key=lambda x: os.path.basename(x))
+        # Sort files naturally (1.mp4, 2.mp4, ..., 10.mp4); key dihitung sekali per file
+        keyed = [(path, _natural_key(os.path.basename(path))) for path in video_files]
+        keyed.sort(key=operator.itemgetter(1))
+        video_files = [path for path, _ in keyed]
         
         logger.info(f"Found {len(video_files)} video files")
         for i, video in enumerate(video_files):
@@ -268,7 +606,13 @@ class CameraDummyManager:
         
         logger.info("Creating sample video files for testing...")
         
-        # Create simple test videos using OpenCV
+        # Satu buffer frame dipakai ulang untuk semua sample video
+        frame = np.empty((480, 640, 3), dtype=np.uint8)
+        # Hanya baris di sekitar teks yang perlu di-reset setiap frame
+        (_, text_h), baseline = cv2.getTextSize("Video 0 - Frame 000", cv2.FONT_HERSHEY_SIMPLEX, 1, 2)
+        text_rows = slice(max(0, 240 - text_h - 4), 240 + baseline + 4)
+        
+        # Create simple test videos (frames digambar dengan OpenCV)
         for i in range(1, 4):  # Create 3 sample videos
             video_path = os.path.join(self.samples_dir, f"{i}.mp4")
             
@@ -276,21 +620,28 @@ class CameraDummyManager:
                 logger.info(f"Sample video {i}.mp4 already exists")
                 continue
             
-            # Create a simple colored video
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            writer = cv2.VideoWriter(video_path, fourcc, 30.0, (640, 480))
+            # Create a simple colored video (encode lewat FFmpeg/libx264 jika tersedia)
+            if _has_ffmpeg():
+                writer = FFmpegPipeWriter(video_path, 30, (640, 480))
+            else:
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                writer = cv2.VideoWriter(video_path, fourcc, 30.0, (640, 480))
+            
+            # Create colored frame
+            if i == 1:
+                color = (0, 0, 255)  # Red
+            elif i == 2:
+                color = (0, 255, 0)  # Green
+            else:
+                color = (255, 0, 0)  # Blue
+            
+            # Background diisi warna sekali per video
+            frame[:] = color
             
             # Generate 300 frames (10 seconds at 30 FPS)
             for frame_num in range(300):
-                # Create colored frame
-                if i == 1:
-                    color = (0, 0, 255)  # Red
-                elif i == 2:
-                    color = (0, 255, 0)  # Green
-                else:
-                    color = (255, 0, 0)  # Blue
-                
-                frame = np.full((480, 640, 3), color, dtype=np.uint8)
+                # Hapus teks frame sebelumnya
+                frame[text_rows] = color
                 
                 # Add frame number
                 cv2.putText(frame, f"Video {i} - Frame {frame_num}", 
@@ -301,6 +652,46 @@ class CameraDummyManager:
             writer.release()
             logger.info(f"Created sample video: {video_path}")
     
+    def _cache_videos_in_shm(self, video_files):
+        """Copy each unique sample once into /dev/shm/choco and return the cached paths.
+
+        Files that do not fit in the tmpfs (Docker defaults /dev/shm to 64MB)
+        or fail to copy keep their original path.
+        """
+        if not os.path.isdir(SHM_DIR):
+            logger.info(f"{SHM_DIR} not available, streaming samples from {self.samples_dir}")
+            return video_files
+
+        cache_dir = os.path.join(SHM_DIR, 'choco')
+        cached = {}
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Cannot create {cache_dir}: {e}")
+            return video_files
+
+        for path in video_files:
+            if path in cached:
+                continue
+            dest = os.path.join(cache_dir, os.path.basename(path))
+            try:
+                src_stat = os.stat(path)
+                if os.path.exists(dest) and os.path.getsize(dest) == src_stat.st_size:
+                    cached[path] = dest
+                    continue
+                if shutil.disk_usage(cache_dir).free < src_stat.st_size:
+                    logger.warning(f"Not enough space in {cache_dir} for {os.path.basename(path)}")
+                    cached[path] = path
+                    continue
+                shutil.copyfile(path, dest)
+                cached[path] = dest
+                logger.info(f"Cached {os.path.basename(path)} in {cache_dir}")
+            except OSError as e:
+                logger.warning(f"Failed to cache {os.path.basename(path)} in {cache_dir}: {e}")
+                cached[path] = path
+
+        return [cached[path] for path in video_files]
+
     def start_all_cameras(self, use_ffmpeg=True):
         """Start all camera streams"""
         video_files = self.discover_video_files()
@@ -320,33 +711,65 @@ class CameraDummyManager:
             logger.error("No video files available to start cameras.")
             return []
 
+        if self.shm_cache:
+            video_files = self._cache_videos_in_shm(video_files)
+
         self.running = True
         rtsp_urls = []
 
         logger.info(f"Starting {num_cameras} camera streams...")
         
+        if not use_ffmpeg:
+            # SharedDecoder hanya untung jika satu file dipakai >1 kamera; untuk satu kamera thread
+            # decoder + frame.copy() per frame justru lebih lambat dari VideoCapture milik kamera sendiri
+            uses = {}
+            for i in range(num_cameras):
+                video_file = video_files[i % len(video_files)]
+                uses[video_file] = uses.get(video_file, 0) + 1
+            for video_file, count in uses.items():
+                if count > 1 and video_file not in self._decoders:
+                    decoder = SharedDecoder(video_file)
+                    self._decoders[video_file] = decoder if decoder.start() else None
+
+        # Bagi CPU ke semua kamera supaya encoder tidak over-subscribe (N kamera x nproc thread)
+        threads_per_cam = max(1, (os.cpu_count() or 4) // num_cameras)
+
         # If fewer video files than requested cameras, reuse videos cyclically
+        cameras = []
         for i in range(num_cameras):
             video_file = video_files[i % len(video_files)]
             camera_id = i + 1
             # Use consistent RTSP server host and port for all cameras
             port = self.rtsp_port
             
-            camera = RTSPCameraDummy(
+            cameras.append(RTSPCameraDummy(
                 video_file,
                 camera_id,
                 rtsp_port=port,
                 max_fps=self.max_fps,
-                rtsp_host=self.rtsp_host
-            )
-            rtsp_url = camera.start(use_ffmpeg)
-            
+                rtsp_host=self.rtsp_host,
+                hw_encoder=self.hw_encoder,
+                realtime_input=self.realtime_input,
+                decoder=self._decoders.get(video_file),
+                threads=threads_per_cam
+            ))
+
+        results = None
+        if use_ffmpeg and self.shared_ffmpeg:
+            results = self._start_shared_ffmpeg(cameras)
+
+        if results is None:
+            # Start semua kamera secara paralel (probe + fork/exec ffmpeg saling overlap)
+            with ThreadPoolExecutor(max_workers=num_cameras) as executor:
+                results = list(executor.map(lambda cam: cam.start(use_ffmpeg), cameras))
+
+        for camera, rtsp_url in zip(cameras, results):
             if rtsp_url:
                 self.cameras.append(camera)
                 rtsp_urls.append(rtsp_url)
-                logger.info(f"Camera {camera_id} started successfully")
+                logger.info(f"Camera {camera.camera_id} started successfully")
             else:
-                logger.error(f"Failed to start camera {camera_id}")
+                logger.error(f"Failed to start camera {camera.camera_id}")
         
         # Display all RTSP URLs
         logger.info("\n" + "="*50)
@@ -358,14 +781,68 @@ class CameraDummyManager:
         
         return rtsp_urls
     
+    def _start_shared_ffmpeg(self, cameras):
+        """Stream all cameras from one FFmpeg process using -map fanout.
+
+        Only possible with stream copy (no per-output encoder), so this returns
+        None when a cap is set or any source is not H.264/HEVC; the caller then
+        falls back to one process per camera.
+        """
+        if self.max_fps is not None:
+            logger.info("Shared FFmpeg needs stream copy; max_fps is set, using per-camera processes")
+            return None
+
+        # Satu input per file unik, dipakai ulang oleh kamera yang share file yang sama
+        input_index = {}
+        for camera in cameras:
+            if camera.video_path in input_index:
+                continue
+            codec = _probe_codec(camera.video_path)
+            if codec not in RTSP_COPY_CODECS:
+                logger.info(f"Shared FFmpeg needs stream copy; {os.path.basename(camera.video_path)} "
+                            f"is {codec}, using per-camera processes")
+                return None
+            input_index[camera.video_path] = len(input_index)
+
+        cmd = ['ffmpeg', '-re']
+        for path in input_index:
+            cmd += ['-stream_loop', '-1', '-i', path]
+        for camera in cameras:
+            cmd += ['-map', f"{input_index[camera.video_path]}:v", '-c:v', 'copy', '-f', 'rtsp', camera.rtsp_url]
+
+        try:
+            logger.info(f"Starting shared FFmpeg for {len(cameras)} cameras ({len(input_index)} inputs)")
+            self.shared_process = _launch_ffmpeg(cmd)
+        except Exception as e:
+            logger.error(f"Error starting shared FFmpeg: {e}")
+            return None
+
+        for camera in cameras:
+            camera.running = True
+        return [camera.rtsp_url for camera in cameras]
+
     def stop_all_cameras(self):
         """Stop all camera streams"""
         logger.info("Stopping all cameras...")
         self.running = False
+        self._stop_evt.set()
+        
+        if self.shared_process:
+            self.shared_process.terminate()
+            try:
+                self.shared_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.shared_process.kill()
+            self.shared_process = None
         
         for camera in self.cameras:
             camera.stop()
         
+        for decoder in self._decoders.values():
+            if decoder is not None:
+                decoder.stop()
+        self._decoders.clear()
+        
         self.cameras.clear()
         logger.info("All cameras stopped")
     
@@ -380,9 +857,12 @@ class CameraDummyManager:
             
             logger.info("Camera dummy is running. Press Ctrl+C to stop...")
             
-            # Keep running until interrupted
-            while self.running:
-                time.sleep(1)
+            # Keep running until interrupted (blok tanpa polling sampai stop event di-set)
+            self._waiting = True
+            try:
+                self._stop_evt.wait()
+            finally:
+                self._waiting = False
                 
         except KeyboardInterrupt:
             logger.info("Received interrupt signal...")
@@ -391,10 +871,18 @@ class CameraDummyManager:
         finally:
             self.stop_all_cameras()
 
-def signal_handler(signum, frame):
-    """Handle interrupt signals"""
-    logger.info("Received signal to stop...")
-    sys.exit(0)
+def make_signal_handler(manager):
+    """Build a signal handler that wakes the manager's run() loop, or exits outside of it"""
+    def signal_handler(signum, frame):
+        """Handle interrupt signals"""
+        logger.info("Received signal to stop...")
+        if manager._waiting:
+            manager._stop_evt.set()
+        else:
+            # Startup, probing atau --create-samples: hentikan seperti sebelumnya
+            # (run() tetap membersihkan kamera di blok finally)
+            sys.exit(0)
+    return signal_handler
 
 def main():
     parser = argparse.ArgumentParser(description='RTSP Camera Dummy Simulator')
@@ -408,17 +896,27 @@ def main():
                        help='Create sample video files for testing')
     parser.add_argument('--max-fps', type=int, default=None,
                        help='Optional maximum output FPS for streaming (default: no limit)')
+    parser.add_argument('--shared-ffmpeg', action='store_true',
+                       help='Stream all cameras from a single FFmpeg process (H.264/HEVC sources only)')
+    parser.add_argument('--no-realtime-input', action='store_true',
+                       help='Drop FFmpeg -re when --max-fps is set and let -r / the RTSP server pace output')
+    parser.add_argument('--shm-cache', action='store_true',
+                       help='Copy sample videos to /dev/shm once and stream them from there')
     
     args = parser.parse_args()
     
+    # Create manager
+    rtsp_server_env = os.getenv('RTSP_SERVER', None)
+    manager = CameraDummyManager(args.samples_dir, args.base_port, max_fps=args.max_fps, rtsp_server=rtsp_server_env,
+                                 shared_ffmpeg=args.shared_ffmpeg,
+                                 realtime_input=not args.no_realtime_input,
+                                 shm_cache=args.shm_cache)
+    
     # Setup signal handlers
+    signal_handler = make_signal_handler(manager)
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    # Create manager
-    rtsp_server_env = os.getenv('RTSP_SERVER', None)
-    manager = CameraDummyManager(args.samples_dir, args.base_port, max_fps=args.max_fps, rtsp_server=rtsp_server_env)
-    
     if args.create_samples:
         manager.create_sample_videos()
         logger.info("Sample videos created. Run without --create-samples to start streaming.")
@@ -427,13 +925,9 @@ def main():
     # Check if FFmpeg is available
     use_ffmpeg = not args.use_opencv
     if use_ffmpeg:
-        try:
-            subprocess.run(['ffmpeg', '-version'], 
-                         stdout=subprocess.DEVNULL, 
-                         stderr=subprocess.DEVNULL, 
-                         check=True)
+        if _has_ffmpeg():
             logger.info("FFmpeg found. Using FFmpeg for RTSP streaming.")
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        else:
             logger.warning("FFmpeg not found. Falling back to OpenCV method.")
             use_ffmpeg = False
     
@@ -5,13 +5,16 @@ Supports multiple cameras, WebRTC/SFU integration, and comprehensive fallback ha
 """
 
 import asyncio
+import functools
+import hashlib
 import json
 import logging
 import os
+import queue
 import sys
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
@@ -20,15 +23,35 @@ import signal
 import cv2
 import numpy as np
 import mysql.connector
+import mysql.connector.pooling
+try:
+    # C extension (_mysql_connector): protokol MySQL di C, bukan Python murni
+    import mysql.connector.connection_cext  # noqa: F401
+    MYSQL_USE_PURE = False
+except ImportError:
+    MYSQL_USE_PURE = True
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
 from ultralytics import YOLO
 import torch
+import torch.nn.functional as F
 import psutil
 
+try:
+    import orjson
+except ImportError:  # optional, 3-5x faster payload encoding
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # optional, MQTT_ENCODING=msgpack
+    msgpack = None
+
 # Load environment variables
 load_dotenv()
 
+# Izinkan TF32 untuk operasi FP32 yang tersisa (Ampere+); tidak berpengaruh di CPU
+torch.set_float32_matmul_precision('high')
+
 class Config:
     """Configuration management with environment variables and defaults"""
     
@@ -40,6 +63,9 @@ class Config:
     # If a camera fails to connect this many times, it will be marked disabled
     CAMERA_MAX_RETRIES = int(os.getenv('CAMERA_MAX_RETRIES', '6'))
     CAMERA_RETRY_INTERVAL = int(os.getenv('CAMERA_RETRY_INTERVAL', '5'))
+    # Accepts 'auto', 'gstreamer' (NVDEC hardware decode) or 'ffmpeg'
+    # (auto uses GStreamer only if OpenCV was built with it, falling back to FFmpeg)
+    RTSP_DECODER = os.getenv('RTSP_DECODER', 'auto').lower()
     
     # Model Configuration
     MODEL_PATH = os.getenv('MODEL_PATH', './models/yolov12n.pt')
@@ -48,6 +74,15 @@ class Config:
     # Accepts 'cpu', 'cuda', or 'auto' (auto will pick cuda if available, else cpu)
     MODEL_DEVICE = os.getenv('MODEL_DEVICE', 'auto')
     MODEL_IMGSZ = int(os.getenv('MODEL_IMGSZ', '640'))
+    # Accepts 'pytorch', 'trt' (exports/loads a TensorRT FP16 engine, CUDA only) or 'onnx'
+    # (exports/loads an ONNX model run by ONNX Runtime / OpenVINO, CPU only); falls back to pytorch
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'pytorch').lower()
+    # ONNX Runtime intra-op threads for MODEL_BACKEND=onnx (0 = ORT default, one per physical core)
+    ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))
+    # torch.compile the PyTorch model on CUDA (ignored for TensorRT / CPU)
+    TORCH_COMPILE = os.getenv('TORCH_COMPILE', '1') == '1'
+    # FP16 inference for the PyTorch backend on CUDA
+    MODEL_HALF = os.getenv('MODEL_HALF', 'true').lower() == 'true'
     
     # MQTT Configuration
     MQTT_BROKER = os.getenv('MQTT_BROKER', 'localhost')
@@ -57,6 +92,14 @@ class Config:
     MQTT_CLIENT_ID = os.getenv('MQTT_CLIENT_ID', 'yolo_inference_service')
     MQTT_TOPIC_PREFIX = os.getenv('MQTT_TOPIC_PREFIX', 'cameras')
     MQTT_QOS = int(os.getenv('MQTT_QOS', '1'))
+    # Publish once per N processed frames per camera (1 = every frame)
+    MQTT_BATCH_FRAMES = max(1, int(os.getenv('MQTT_BATCH_FRAMES', '1')))
+    # Coalesce each camera's frames into one message per tick of N seconds (0 = off, overrides MQTT_BATCH_FRAMES)
+    MQTT_BATCH_INTERVAL = float(os.getenv('MQTT_BATCH_INTERVAL', '0'))
+    # Short-key payload schema {c, s, t, d:[{l, p, b}]} (see README "MQTT Topics"); subscribers must opt in too
+    MQTT_COMPACT = os.getenv('MQTT_COMPACT', 'false').lower() == 'true'
+    # json | msgpack (compact schema with int16-quantized confidence/bbox and class ids)
+    MQTT_ENCODING = os.getenv('MQTT_ENCODING', 'json').lower()
     
     # Database Configuration
     DB_ENABLED = os.getenv('DB_ENABLED', 'false').lower() == 'true'
@@ -70,7 +113,25 @@ class Config:
     # Performance Configuration
     MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
     FRAME_SKIP = int(os.getenv('FRAME_SKIP', '1'))
+    # Skip frames based on measured inference latency vs source FPS instead of fixed FRAME_SKIP
+    ADAPTIVE_FRAME_SKIP = os.getenv('ADAPTIVE_FRAME_SKIP', 'true').lower() == 'true'
+    # Motion gate: if the mean abs difference of a 64x64 grayscale thumbnail vs the previous frame
+    # is below MOTION_THRESHOLD (0-255, 0 = disabled), only every (MOTION_SKIP_FRAMES+1)th static frame is inferred
+    MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', '2.0'))
+    MOTION_SKIP_FRAMES = int(os.getenv('MOTION_SKIP_FRAMES', '2'))
     INFERENCE_INTERVAL = float(os.getenv('INFERENCE_INTERVAL', '0.1'))
+    # Batched inference: max frames per forward (0 = one per active camera) and how long (s)
+    # the batch loop waits for more cameras after the first frame arrives
+    MAX_BATCH = int(os.getenv('MAX_BATCH', '0'))
+    BATCH_WAIT = float(os.getenv('BATCH_WAIT', '0.01'))
+    
+    # Processed-stream publishing: rtsp-simple-server API (e.g. http://rtsp-server:9997) used
+    # to skip annotate+encode when a <camera>_proc path has no readers (empty = always publish)
+    RTSP_API_URL = os.getenv('RTSP_API_URL', '')
+    # While nobody is watching, still push one frame per N seconds so the path stays readable
+    PUBLISH_IDLE_INTERVAL = float(os.getenv('PUBLISH_IDLE_INTERVAL', '1.0'))
+    # H.264 encoder for processed streams: 'auto' (h264_nvenc > h264_v4l2m2m > libx264) or an explicit name
+    PUBLISH_ENCODER = os.getenv('PUBLISH_ENCODER', 'auto')
     
     # SFU Configuration
     SFU_ENABLED = os.getenv('SFU_ENABLED', 'true').lower() == 'true'
@@ -84,29 +145,72 @@ class Config:
 class DatabaseManager:
     """MySQL database manager with connection pooling and fallback handling"""
     
+    INSERT_QUERY = """
+    INSERT INTO detections 
+    (camera_id, frame_seq, label, confidence, bbox_x_center, bbox_y_center, bbox_width, bbox_height)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    # Buffer deteksi di-flush tiap FLUSH_INTERVAL detik atau saat mencapai FLUSH_ROWS baris
+    FLUSH_INTERVAL = 0.2
+    FLUSH_ROWS = 500
+    CAMERA_STATUS_QUERY = """
+    INSERT INTO camera_status (camera_id, status, fps, total_detections)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE status = VALUES(status), fps = VALUES(fps),
+        total_detections = total_detections + VALUES(total_detections)
+    """
+    # Server-side prepared INSERT dengan PREPARED_ROWS baris per execute; di-parse sekali per koneksi
+    PREPARED_ROWS = 50
+    PREPARED_INSERT_QUERY = (
+        "INSERT INTO detections "
+        "(camera_id, frame_seq, label, confidence, bbox_x_center, bbox_y_center, bbox_width, bbox_height) "
+        "VALUES " + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * PREPARED_ROWS)
+    )
+    
     def __init__(self, config: Config):
         self.config = config
-        self.connection = None
+        self.pool = None
         self.enabled = config.DB_ENABLED
         self.logger = logging.getLogger(__name__ + '.DatabaseManager')
+        # Tiap thread memegang satu koneksi pool miliknya
+        self._local = threading.local()
+        # Baris deteksi yang menunggu di-INSERT oleh flusher thread
+        self._det_buf: List[tuple] = []
+        self._det_buf_lock = threading.Lock()
+        self._flush_evt = threading.Event()
+        self._closing = False
+        self._flusher = None
         
         if self.enabled:
             self._initialize_connection()
     
     def _initialize_connection(self):
-        """Initialize database connection with fallback"""
+        """Initialize database connection pool with fallback"""
         try:
-            self.connection = mysql.connector.connect(
+            # Thread kamera hanya mengisi buffer; yang checkout koneksi hanya db-flusher, camera-status
+            # dan pengecekan tabel saat start (+1 cadangan). Pool membuka semua koneksinya saat dibuat
+            pool_size = 4
+            self.pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name='yolo',
+                pool_size=pool_size,
+                pool_reset_session=False,
                 host=self.config.DB_HOST,
                 port=self.config.DB_PORT,
                 user=self.config.DB_USER,
                 password=self.config.DB_PASSWORD,
                 database=self.config.DB_NAME,
-                autocommit=True,
+                # Satu transaksi (satu fsync redo log) per flush, bukan per baris
+                autocommit=False,
+                use_pure=MYSQL_USE_PURE,
                 connection_timeout=10
             )
-            self.logger.info("Database connection established")
+            self.logger.info(f"Database connection pool established (size {pool_size})")
+            if MYSQL_USE_PURE:
+                self.logger.warning("mysql-connector C extension not available; using the pure-Python protocol")
             self._ensure_tables_exist()
+            if self.enabled and self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='db-flusher', daemon=True)
+                self._flusher.start()
         except Exception as e:
             self.logger.error(f"Database connection failed: {e}")
             self.logger.warning("Database logging disabled - service will continue without DB")
@@ -114,14 +218,15 @@ class DatabaseManager:
     
     def _ensure_tables_exist(self):
         """Create tables if they don't exist"""
-        if not self.enabled or not self.connection:
+        if not self.enabled or not self.pool:
             return
             
         try:
-            cursor = self.connection.cursor()
+            conn = self.pool.get_connection()
+            cursor = conn.cursor()
             create_table_query = """
             CREATE TABLE IF NOT EXISTS detections (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id INT AUTO_INCREMENT,
                 camera_id VARCHAR(50) NOT NULL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 frame_seq INT,
@@ -131,36 +236,176 @@ class DatabaseManager:
                 bbox_y_center FLOAT NOT NULL,
                 bbox_width FLOAT NOT NULL,
                 bbox_height FLOAT NOT NULL,
-                INDEX idx_camera_timestamp (camera_id, timestamp),
-                INDEX idx_label (label)
+                PRIMARY KEY (id, timestamp),
+                INDEX idx_camera_timestamp (camera_id, timestamp)
+            )
+            PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+                PARTITION p_init VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01 00:00:00')),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
             )
             """
             cursor.execute(create_table_query)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS camera_status (
+                camera_id VARCHAR(50) PRIMARY KEY,
+                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                status ENUM('online', 'offline', 'error') DEFAULT 'offline',
+                fps FLOAT DEFAULT 0,
+                total_detections INT DEFAULT 0,
+                INDEX idx_status (status),
+                INDEX idx_last_seen (last_seen)
+            )
+            """)
             cursor.close()
+            conn.close()
             self.logger.info("Database tables verified/created")
         except Exception as e:
             self.logger.error(f"Failed to create tables: {e}")
             self.enabled = False
     
+    def _thread_connection(self):
+        """Return this thread's pooled connection, checking one out on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.pool.get_connection()
+            self._local.conn = conn
+        return conn
+    
+    def _insert_cursor(self, conn):
+        """Return this thread's prepared INSERT cursor, preparing it on first use"""
+        cursor = getattr(self._local, 'ins_cursor', None)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True)
+            self._local.ins_cursor = cursor
+        return cursor
+
+    def _reset_thread_connection(self):
+        """Drop this thread's connection so the next call checks out a fresh one"""
+        conn = getattr(self._local, 'conn', None)
+        cursor = getattr(self._local, 'ins_cursor', None)
+        self._local.conn = None
+        self._local.ins_cursor = None
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if conn is not None:
+            try:
+                # Mengembalikan ke pool; pool akan reconnect jika koneksi putus
+                conn.close()
+            except Exception:
+                pass
+    
+    def _enqueue(self, rows: List[tuple]):
+        """Append rows to the flush buffer, waking the flusher early when it is full"""
+        with self._det_buf_lock:
+            self._det_buf.extend(rows)
+            full = len(self._det_buf) >= self.FLUSH_ROWS
+        if full:
+            self._flush_evt.set()
+    
     def log_detection(self, camera_id: str, frame_seq: int, label: str, 
                      confidence: float, bbox: List[float]):
-        """Log detection to database with fallback"""
-        if not self.enabled or not self.connection:
+        """Queue one detection for the next batched flush"""
+        if not self.enabled or not self.pool:
+            return
+        self._enqueue([(camera_id, frame_seq, label, confidence, *bbox)])
+
+    def log_detections_batch(self, camera_id: str, frame_seq: int, detections: List[Dict]):
+        """Queue all detections of one frame for the next batched flush"""
+        if not self.enabled or not self.pool or not detections:
+            return
+        self._enqueue([
+            (camera_id, frame_seq, d["label"], d["confidence"], *d["bbox"])
+            for d in detections
+        ])
+
+    def flush(self):
+        """INSERT all buffered detections in one transaction"""
+        with self._det_buf_lock:
+            rows, self._det_buf = self._det_buf, []
+        if not rows:
             return
             
+        conn = None
         try:
-            cursor = self.connection.cursor()
-            insert_query = """
-            INSERT INTO detections 
-            (camera_id, frame_seq, label, confidence, bbox_x_center, bbox_y_center, bbox_width, bbox_height)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (camera_id, frame_seq, label, confidence, *bbox))
-            cursor.close()
+            conn = self._thread_connection()
+            # Blok penuh lewat prepared statement (tanpa parse ulang di server);
+            # executemany pada cursor prepared dieksekusi per baris, jadi parameter diratakan per blok
+            full = len(rows) - len(rows) % self.PREPARED_ROWS
+            if full:
+                ins_cursor = self._insert_cursor(conn)
+                for start in range(0, full, self.PREPARED_ROWS):
+                    params = [v for row in rows[start:start + self.PREPARED_ROWS] for v in row]
+                    ins_cursor.execute(self.PREPARED_INSERT_QUERY, params)
+            if full < len(rows):
+                # Sisa baris: Connector/Python menulis ulang executemany INSERT jadi satu statement multi-VALUES
+                cursor = conn.cursor()
+                cursor.executemany(self.INSERT_QUERY, rows[full:])
+                cursor.close()
+            conn.commit()
         except Exception as e:
-            self.logger.error(f"Failed to log detection: {e}")
+            self.logger.error(f"Failed to flush {len(rows)} detections: {e}")
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
             # Attempt reconnection
-            self._initialize_connection()
+            self._reset_thread_connection()
+
+    def update_camera_status(self, rows: List[tuple]):
+        """UPSERT (camera_id, status, fps, new_detections) for all cameras in one transaction"""
+        if not self.enabled or not self.pool or not rows:
+            return
+        conn = None
+        try:
+            conn = self._thread_connection()
+            cursor = conn.cursor()
+            cursor.executemany(self.CAMERA_STATUS_QUERY, rows)
+            cursor.close()
+            conn.commit()
+        except Exception as e:
+            self.logger.error(f"Failed to update camera status: {e}")
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            self._reset_thread_connection()
+
+    def release_thread_connection(self):
+        """Return the calling thread's pooled connection (call before a DB-using thread exits)"""
+        self._reset_thread_connection()
+
+    def _flush_loop(self):
+        """Background flusher: write the buffer every FLUSH_INTERVAL or when FLUSH_ROWS is reached"""
+        while True:
+            self._flush_evt.wait(self.FLUSH_INTERVAL)
+            self._flush_evt.clear()
+            self.flush()
+            if self._closing:
+                self._reset_thread_connection()
+                return
+
+    def close(self):
+        """Flush pending detections, stop the flusher thread and close pooled connections"""
+        self._closing = True
+        self._flush_evt.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        if self.pool is not None:
+            # MySQLConnectionPool tidak punya close(); tutup koneksi yang sedang idle di pool
+            while True:
+                try:
+                    cnx = self.pool._cnx_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    cnx.close()
+                except Exception:
+                    pass
 
 class MQTTManager:
     """MQTT client manager with automatic reconnection"""
@@ -168,11 +413,39 @@ class MQTTManager:
     def __init__(self, config: Config):
         self.config = config
         self.client = mqtt.Client(client_id=config.MQTT_CLIENT_ID)
+        # QoS 1 publishes yang boleh menunggu PUBACK sekaligus (default paho: 20)
+        self.client.max_inflight_messages_set(100)
         self.connected = False
+        # Per-camera frames waiting to be published when MQTT_BATCH_FRAMES > 1 or MQTT_BATCH_INTERVAL > 0
+        self._pending: Dict[str, List[Dict]] = {}
+        self._pending_since: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
+        self._tick_stop = threading.Event()
+        self._tick_thread = None
+        # Hasil publish terakhir; close() menunggu ini sebelum loop_stop() (QoS 1 in-flight)
+        self._last_info = None
+        # Prefix JSON konstan per kamera: b'{"camera_id":"cam01","timestamp":'
+        self._payload_prefix: Dict[str, bytes] = {}
+        # Label -> class id model untuk payload msgpack (diisi InferenceService setelah model dimuat)
+        self.label_ids: Dict[str, int] = {}
         self.logger = logging.getLogger(__name__ + '.MQTTManager')
         
+        self.use_msgpack = config.MQTT_ENCODING == 'msgpack'
+        if self.use_msgpack and msgpack is None:
+            self.logger.warning("MQTT_ENCODING=msgpack but msgpack is not installed, using JSON")
+            self.use_msgpack = False
+        # msgpack selalu memakai schema ringkas
+        self.compact = config.MQTT_COMPACT or self.use_msgpack
+        
         self._setup_callbacks()
         self._connect()
+        
+        # Tick thread: kirim buffer tiap MQTT_BATCH_INTERVAL, atau (MQTT_BATCH_FRAMES > 1) kirim batch
+        # parsial yang sudah melewati window supaya kamera yang macet tidak menahan frame-nya
+        self._interval_batching = config.MQTT_BATCH_INTERVAL > 0
+        if self._interval_batching or config.MQTT_BATCH_FRAMES > 1:
+            self._tick_thread = threading.Thread(target=self._tick_loop, name='mqtt-tick', daemon=True)
+            self._tick_thread.start()
     
     def _setup_callbacks(self):
         """Setup MQTT callbacks"""
@@ -202,7 +475,74 @@ class MQTTManager:
             self.logger.error(f"MQTT connection failed: {e}")
             self.connected = False
     
-    def publish_detection(self, camera_id: str, detections: List[Dict]):
+    @staticmethod
+    def _dumps(obj) -> bytes:
+        """Serialize to compact JSON bytes (orjson if installed)"""
+        if orjson is not None:
+            return orjson.dumps(obj)
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    def _encode_payload(self, camera_id: str, timestamp: int, detections: List[Dict]) -> bytes:
+        """Build {camera_id, timestamp, detections} from a cached per-camera prefix"""
+        prefix = self._payload_prefix.get(camera_id)
+        if prefix is None:
+            prefix = b'{"camera_id":' + self._dumps(camera_id) + b',"timestamp":'
+            self._payload_prefix[camera_id] = prefix
+        return b''.join((prefix, str(timestamp).encode(), b',"detections":', self._dumps(detections), b'}'))
+
+    def _serialize(self, obj) -> bytes:
+        """Serialize a compact-schema payload with the configured encoding"""
+        if self.use_msgpack:
+            return msgpack.packb(obj, use_bin_type=True)
+        return self._dumps(obj)
+
+    def _frame_entry(self, timestamp: int, frame_seq: Optional[int], detections: List[Dict]) -> Dict:
+        """One frame of a payload, in the compact schema when MQTT_COMPACT is set"""
+        if self.use_msgpack:
+            if not detections:
+                return {"s": frame_seq, "t": timestamp, "d": []}
+            # Kuantisasi: confidence 0..65535, bbox ternormalisasi 0..16384
+            conf = np.array([d["confidence"] for d in detections], dtype=np.float32)
+            bbox = np.clip(np.array([d["bbox"] for d in detections], dtype=np.float32), 0.0, 1.0)
+            conf_q = (conf * 65535).astype(np.uint16).tolist()
+            bbox_q = (bbox * 16384).astype(np.uint16).tolist()
+            label_ids = self.label_ids
+            return {
+                "s": frame_seq,
+                "t": timestamp,
+                "d": [{"l": label_ids.get(d["label"], d["label"]), "p": p, "b": b}
+                      for d, p, b in zip(detections, conf_q, bbox_q)]
+            }
+        if self.compact:
+            return {
+                "s": frame_seq,
+                "t": timestamp,
+                "d": [{"l": d["label"], "p": d["confidence"], "b": d["bbox"]} for d in detections]
+            }
+        return {"timestamp": timestamp, "detections": detections}
+
+    def _encode_frames(self, camera_id: str, frames: List[Dict]) -> bytes:
+        """Serialize several queued frames of one camera into a single message"""
+        if self.compact:
+            return self._serialize({"c": camera_id, "f": frames})
+        latest = frames[-1]
+        # Field lama diisi frame terbaru supaya subscriber lama tetap kompatibel
+        return self._dumps({
+            "camera_id": camera_id,
+            "timestamp": latest["timestamp"],
+            "detections": latest["detections"],
+            "frames": frames
+        })
+
+    def _publish(self, camera_id: str, data: bytes):
+        """Publish one encoded message to the camera's detections topic"""
+        topic = f"{self.config.MQTT_TOPIC_PREFIX}/{camera_id}/detections"
+        result = self.client.publish(topic, data, qos=self.config.MQTT_QOS)
+        self._last_info = result
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.logger.error(f"Failed to publish to MQTT: {result.rc}")
+
+    def publish_detection(self, camera_id: str, detections: List[Dict], frame_seq: Optional[int] = None):
         """Publish detection results to MQTT"""
         if not self.connected:
             self.logger.warning("MQTT not connected, attempting reconnection")
@@ -210,19 +550,83 @@ class MQTTManager:
             return
         
         try:
-            topic = f"{self.config.MQTT_TOPIC_PREFIX}/{camera_id}/detections"
-            payload = {
-                "camera_id": camera_id,
-                "timestamp": int(time.time() * 1000),
-                "detections": detections
-            }
+            timestamp = int(time.time() * 1000)
+            
+            if self._interval_batching:
+                # Dikirim oleh mqtt-tick thread pada tick berikutnya
+                entry = self._frame_entry(timestamp, frame_seq, detections)
+                with self._pending_lock:
+                    self._pending.setdefault(camera_id, []).append(entry)
+                return
             
-            result = self.client.publish(topic, json.dumps(payload), qos=self.config.MQTT_QOS)
-            if result.rc != mqtt.MQTT_ERR_SUCCESS:
-                self.logger.error(f"Failed to publish to MQTT: {result.rc}")
+            batch_frames = self.config.MQTT_BATCH_FRAMES
+            if batch_frames > 1:
+                # Kumpulkan N frame; batch parsial yang melewati window dikirim oleh mqtt-tick thread
+                entry = self._frame_entry(timestamp, frame_seq, detections)
+                with self._pending_lock:
+                    pending = self._pending.setdefault(camera_id, [])
+                    if not pending:
+                        self._pending_since[camera_id] = time.monotonic()
+                    pending.append(entry)
+                    if len(pending) < batch_frames:
+                        return
+                    self._pending[camera_id] = []
+                data = self._encode_frames(camera_id, pending)
+            elif self.compact:
+                data = self._serialize({"c": camera_id, **self._frame_entry(timestamp, frame_seq, detections)})
+            else:
+                data = self._encode_payload(camera_id, timestamp, detections)
+            
+            self._publish(camera_id, data)
         except Exception as e:
             self.logger.error(f"MQTT publish error: {e}")
 
+    def flush_pending(self, max_age: Optional[float] = None):
+        """Publish queued frames as one message per camera (only batches older than max_age if given)"""
+        now = time.monotonic()
+        with self._pending_lock:
+            due = {}
+            for camera_id, frames in self._pending.items():
+                if frames and (max_age is None or now - self._pending_since.get(camera_id, now) >= max_age):
+                    due[camera_id] = frames
+            for camera_id in due:
+                self._pending[camera_id] = []
+        if not due or not self.connected:
+            return
+        for camera_id, frames in due.items():
+            try:
+                self._publish(camera_id, self._encode_frames(camera_id, frames))
+            except Exception as e:
+                self.logger.error(f"MQTT publish error: {e}")
+
+    def _tick_loop(self):
+        """Flush the per-camera buffers every tick"""
+        if self._interval_batching:
+            interval, max_age = self.config.MQTT_BATCH_INTERVAL, None
+        else:
+            # Batas umur batch parsial = waktu normal untuk mengumpulkan MQTT_BATCH_FRAMES frame
+            max_age = self.config.INFERENCE_INTERVAL * self.config.MQTT_BATCH_FRAMES
+            interval = max(0.05, self.config.INFERENCE_INTERVAL)
+        while not self._tick_stop.wait(interval):
+            self.flush_pending(max_age)
+
+    def close(self):
+        """Publish what is still queued, wait for in-flight publishes, then disconnect"""
+        self._tick_stop.set()
+        if self._tick_thread is not None:
+            self._tick_thread.join(timeout=1)
+            self.flush_pending()
+        if self.connected:
+            info = self._last_info
+            if info is not None:
+                try:
+                    # Publish diproses berurutan; selesai yang terakhir berarti antrean sudah terkirim
+                    info.wait_for_publish(timeout=2)
+                except Exception as e:
+                    self.logger.debug(f"Pending MQTT publishes not confirmed: {e}")
+            self.client.loop_stop()
+            self.client.disconnect()
+
 class YOLOInference:
     """YOLOv12 inference engine with model fallback"""
     
@@ -231,6 +635,21 @@ class YOLOInference:
         self.model = None
         self.logger = logging.getLogger(__name__ + '.YOLOInference')
         self.device = config.MODEL_DEVICE
+        # Backend yang benar-benar dipakai setelah _load_model ('pytorch' atau 'trt')
+        self.backend = 'pytorch'
+        # True jika model PyTorch dijalankan dalam FP16 di CUDA
+        self.half = False
+        # model.names sebagai array, supaya label seluruh batch deteksi diambil dengan satu indexing
+        self._names_arr: Optional[np.ndarray] = None
+        # Page-locked host buffers per (slot batch, shape frame) untuk upload frame ke GPU
+        self._pinned: Dict[Tuple[int, ...], torch.Tensor] = {}
+        # Tensor input model di GPU per ukuran batch, diisi ulang in-place tiap batch
+        self._gpu_inputs: Dict[Tuple[int, ...], torch.Tensor] = {}
+        # Buffer GPU resolusi penuh per (slot batch, shape frame): uint8 HWC hasil upload
+        # dan CHW float/half hasil cast, dipakai ulang tiap frame
+        self._gpu_frames: Dict[Tuple[int, ...], Tuple[torch.Tensor, torch.Tensor]] = {}
+        # Satu CUDA stream per slot batch (= per kamera) untuk upload frame
+        self._upload_streams: List['torch.cuda.Stream'] = []
         
         # Log torch / CUDA info early to help debugging GPU availability
         self._log_cuda_info()
@@ -287,35 +706,245 @@ class YOLOInference:
                 else:
                     device = requested
 
-            # If a fallback model object was created during download, use it directly
-            if hasattr(self, '_fallback_model_obj') and self._fallback_model_obj is not None:
-                self.model = self._fallback_model_obj
+            engine_model = None
+            if model_path.suffix == '.engine' and device.startswith('cuda'):
+                # Engine hasil export_engine.py: langsung dipakai, tanpa memuat .pt
+                engine_model = YOLO(str(model_path), task='detect')
+                backend = 'trt'
+            else:
+                # If a fallback model object was created during download, use it directly
+                if hasattr(self, '_fallback_model_obj') and self._fallback_model_obj is not None:
+                    self.model = self._fallback_model_obj
+                else:
+                    # Load model from file/path
+                    self.model = YOLO(str(model_path))
+                backend = self.config.MODEL_BACKEND
+                if backend == 'trt':
+                    engine_model = self._load_tensorrt_engine(model_path, device)
+                elif backend == 'onnx':
+                    engine_model = self._load_onnx_model(model_path, device)
+
+            if engine_model is not None:
+                self.model = engine_model
+                self.backend = backend
+                self.logger.info(f"YOLO {self.backend} model loaded successfully on {device}")
             else:
-                # Load model from file/path
-                self.model = YOLO(str(model_path))
-            try:
-                self.model.to(device)
-                self.logger.info(f"YOLO model loaded successfully on {device}")
-            except Exception as e:
-                # If moving to the requested device fails, fallback to CPU
-                self.logger.warning(f"Failed moving model to {device}: {e}; falling back to CPU")
                 try:
-                    self.model.to('cpu')
-                    device = 'cpu'
-                    self.logger.info("YOLO model moved to CPU successfully")
-                except Exception as e2:
-                    self.logger.error(f"Failed to move model to CPU as fallback: {e2}")
-                    raise
+                    self.model.to(device)
+                    self.logger.info(f"YOLO model loaded successfully on {device}")
+                except Exception as e:
+                    # If moving to the requested device fails, fallback to CPU
+                    self.logger.warning(f"Failed moving model to {device}: {e}; falling back to CPU")
+                    try:
+                        self.model.to('cpu')
+                        device = 'cpu'
+                        self.logger.info("YOLO model moved to CPU successfully")
+                    except Exception as e2:
+                        self.logger.error(f"Failed to move model to CPU as fallback: {e2}")
+                        raise
             
-            # Warm up model
-            dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-            self.model.predict(dummy_img, verbose=False)
+            if device.startswith('cuda'):
+                # Input shape tetap (MODEL_IMGSZ), biarkan cuDNN memilih algoritma conv tercepat sekali
+                torch.backends.cudnn.benchmark = True
+
+            cuda_pytorch = self.backend == 'pytorch' and device.startswith('cuda')
+            if cuda_pytorch:
+                # Fuse conv+BN sekarang; predictor Ultralytics melewati fuse jika model sudah fused,
+                # sehingga format memori di bawah tidak di-reset
+                self.model.model.fuse(verbose=False)
+                if self.config.MODEL_HALF:
+                    # FP16 memakai tensor core
+                    self.model.model.half()
+                    self.half = True
+                    self.logger.info("YOLO model running in FP16")
+                # NHWC (channels-last) lebih cocok untuk conv tensor core di GPU Ampere+
+                self.model.model = self.model.model.to(memory_format=torch.channels_last)
+
+            # Warm up model (untuk TensorRT sekaligus menyiapkan execution context)
+            dummy_img = np.zeros((self.config.MODEL_IMGSZ, self.config.MODEL_IMGSZ, 3), dtype=np.uint8)
+            self.model.predict(dummy_img, imgsz=self.config.MODEL_IMGSZ, half=self.half, verbose=False)
+
+            if device.startswith('cuda'):
+                self._install_gpu_preprocess()
+            elif self.backend == 'onnx':
+                self._tune_onnx_session()
+
+            if cuda_pytorch and self._compile_model():
+                try:
+                    # Shape statis: kompilasi + capture CUDA graph tiap ukuran batch yang bisa dibentuk batch
+                    # loop sekarang, bukan di jalur serving (di sana jauh melebihi BATCH_RESULT_TIMEOUT).
+                    # Satu frame per kamera per batch, jadi batch tidak pernah melebihi CAMERA_COUNT
+                    max_batch = max(1, min(self.config.MAX_BATCH or self.config.CAMERA_COUNT,
+                                           self.config.CAMERA_COUNT))
+                    for batch_size in range(1, max_batch + 1):
+                        self.logger.info(f"Compiling YOLO model for batch size {batch_size}/{max_batch}...")
+                        for _ in range(3):
+                            self.model.predict([dummy_img] * batch_size, imgsz=self.config.MODEL_IMGSZ,
+                                               half=self.half, verbose=False)
+                except Exception as e:
+                    self.logger.warning(f"torch.compile warmup failed: {e}; falling back to eager mode")
+                    self.model.predictor.model.model = self._eager_model
+                    self.model.predict(dummy_img, imgsz=self.config.MODEL_IMGSZ, half=self.half, verbose=False)
             self.logger.info("Model warmed up successfully")
             
         except Exception as e:
             self.logger.error(f"Failed to load YOLO model: {e}")
             self.model = None
     
+    def _compile_model(self) -> bool:
+        """Wrap the inner nn.Module with torch.compile (reduce-overhead); returns True on success"""
+        if not self.config.TORCH_COMPILE or not hasattr(torch, 'compile'):
+            return False
+
+        try:
+            # Compile nn.Module yang dipakai predictor (AutoBackend), bukan wrapper Ultralytics;
+            # dilakukan setelah warmup pertama karena setup predictor memanggil fuse() yang
+            # mengembalikan module asli (membuang wrapper compile)
+            backend = self.model.predictor.model
+            self._eager_model = backend.model
+            backend.model = torch.compile(self._eager_model, mode='reduce-overhead', dynamic=False)
+            self.logger.info("YOLO model wrapped with torch.compile (reduce-overhead)")
+            return True
+        except Exception as e:
+            self.logger.warning(f"torch.compile failed: {e}; using eager mode")
+            return False
+
+    def _install_gpu_preprocess(self):
+        """Replace the predictor's preprocess: upload raw frames via pinned memory and letterbox on the GPU"""
+        predictor = self.model.predictor
+        original = predictor.preprocess
+
+        def preprocess(im):
+            if isinstance(im, torch.Tensor):
+                return original(im)
+            ph, pw = predictor.imgsz
+            dtype = torch.half if predictor.model.fp16 else torch.float
+            # Kanvas letterbox persegi berisi warna pad Ultralytics (114)
+            out = self._gpu_inputs.get((len(im), ph, pw))
+            if out is None or out.dtype != dtype:
+                out = torch.empty((len(im), 3, ph, pw), dtype=dtype, device=predictor.device)
+                self._gpu_inputs[(len(im), ph, pw)] = out
+            out.fill_(114 / 255)
+            main_stream = torch.cuda.current_stream(predictor.device)
+            for i, frame in enumerate(im):
+                h, w = frame.shape[:2]
+                host = self._pinned.get((i, *frame.shape))
+                if host is None:
+                    host = torch.empty(frame.shape, dtype=torch.uint8).pin_memory()
+                    self._pinned[(i, *frame.shape)] = host
+                # Aman dipakai ulang: hasil batch sebelumnya sudah di-.cpu() (sinkron)
+                # sebelum batch berikutnya masuk
+                np.copyto(host.numpy(), frame)
+                # Upload + letterbox tiap frame di stream sendiri supaya copy H2D saling tumpang tindih
+                stream = self._upload_stream(i, predictor.device)
+                stream.wait_stream(main_stream)  # tunggu fill_ pada kanvas
+                with torch.cuda.stream(stream):
+                    bufs = self._gpu_frames.get((i, *frame.shape))
+                    if bufs is None or bufs[1].dtype != dtype:
+                        # Dialokasikan di stream slot ini, dan hanya dipakai di stream ini
+                        bufs = (torch.empty(frame.shape, dtype=torch.uint8, device=predictor.device),
+                                torch.empty((1, 3, h, w), dtype=dtype, device=predictor.device))
+                        self._gpu_frames[(i, *frame.shape)] = bufs
+                    gpu, x = bufs
+                    gpu.copy_(host, non_blocking=True)
+                    # Satu-satunya pass di resolusi penuh: HWC uint8 -> CHW float (permute hanya view)
+                    x[0].copy_(gpu.permute(2, 0, 1))
+                    # Resize di GPU dengan geometri yang sama seperti LetterBox, supaya scale_boxes
+                    # di postprocess tetap memetakan box ke ukuran frame asli
+                    gain = min(ph / h, pw / w)
+                    nh, nw = int(round(h * gain)), int(round(w * gain))
+                    if (nh, nw) != (h, w):
+                        x = F.interpolate(x, size=(nh, nw), mode='bilinear', align_corners=False)
+                    top = int(round((ph - nh) / 2 - 0.1))
+                    left = int(round((pw - nw) / 2 - 0.1))
+                    # BGR -> RGB dan /255 setelah resize (linear, jadi urutan tidak mengubah hasil),
+                    # digabung dengan copy ke kanvas di resolusi model
+                    dst = out[i, :, top:top + nh, left:left + nw]
+                    torch.mul(x[0].flip(0), 1 / 255, out=dst)
+            # Forward (di stream utama) baru jalan setelah semua upload selesai
+            for i in range(len(im)):
+                main_stream.wait_stream(self._upload_streams[i])
+            return out
+
+        predictor.preprocess = preprocess
+        self.logger.info("Frame preprocessing (upload via pinned memory + letterbox) runs on the GPU")
+
+    def _upload_stream(self, slot: int, device) -> 'torch.cuda.Stream':
+        """CUDA stream used to upload/preprocess the frame in a given batch slot"""
+        while len(self._upload_streams) <= slot:
+            self._upload_streams.append(torch.cuda.Stream(device=device))
+        return self._upload_streams[slot]
+
+    def _load_tensorrt_engine(self, model_path: Path, device: str):
+        """Export (once) and load a TensorRT FP16 engine; returns None to fall back to PyTorch"""
+        if not device.startswith('cuda'):
+            self.logger.warning("MODEL_BACKEND=trt requires a CUDA device; using PyTorch backend")
+            return None
+
+        try:
+            # Engine spesifik untuk imgsz + GPU, simpan di samping file .pt
+            tag = hashlib.sha1(f"{self.config.MODEL_IMGSZ}-{device}".encode()).hexdigest()[:8]
+            engine_path = model_path.with_name(f"{model_path.stem}-{tag}.engine")
+
+            if not engine_path.exists():
+                self.logger.info(f"Exporting TensorRT engine to {engine_path} (this can take a few minutes)...")
+                gpu_index = device.split(':', 1)[1] if ':' in device else 0
+                exported = self.model.export(
+                    format='engine',
+                    half=True,
+                    imgsz=self.config.MODEL_IMGSZ,
+                    device=gpu_index,
+                    workspace=4
+                )
+                Path(exported).replace(engine_path)
+
+            return YOLO(str(engine_path), task='detect')
+        except Exception as e:
+            self.logger.warning(f"TensorRT engine export/load failed: {e}; using PyTorch backend")
+            return None
+
+    def _load_onnx_model(self, model_path: Path, device: str):
+        """Export (once) and load an ONNX model for CPU inference; returns None to fall back to PyTorch"""
+        if not device.startswith('cpu'):
+            self.logger.warning("MODEL_BACKEND=onnx is meant for CPU deployments; using PyTorch backend")
+            return None
+
+        try:
+            self._onnx_path = model_path.with_name(f"{model_path.stem}-{self.config.MODEL_IMGSZ}.onnx")
+            if not self._onnx_path.exists():
+                self.logger.info(f"Exporting ONNX model to {self._onnx_path}...")
+                exported = self.model.export(
+                    format='onnx',
+                    simplify=True,
+                    opset=17,
+                    imgsz=self.config.MODEL_IMGSZ
+                )
+                Path(exported).replace(self._onnx_path)
+
+            return YOLO(str(self._onnx_path), task='detect')
+        except Exception as e:
+            self.logger.warning(f"ONNX export/load failed: {e}; using PyTorch backend")
+            return None
+
+    def _tune_onnx_session(self):
+        """Recreate the predictor's ONNX Runtime session with tuned options and OpenVINO if present"""
+        try:
+            import onnxruntime as ort
+
+            so = ort.SessionOptions()
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.config.ONNX_THREADS > 0:
+                so.intra_op_num_threads = self.config.ONNX_THREADS
+            available = ort.get_available_providers()
+            providers = [p for p in ('OpenVINOExecutionProvider', 'CPUExecutionProvider') if p in available]
+            # AutoBackend memanggil self.session.run(...) saat forward, cukup ganti session-nya
+            self.model.predictor.model.session = ort.InferenceSession(
+                str(self._onnx_path), sess_options=so, providers=providers)
+            threads = self.config.ONNX_THREADS or 'default'
+            self.logger.info(f"ONNX Runtime session using {providers[0]} ({threads} threads)")
+        except Exception as e:
+            self.logger.warning(f"Failed to tune ONNX Runtime session: {e}; keeping default session")
+
     def _download_fallback_model(self):
         """Download YOLOv8n as fallback if YOLOv12n not available"""
         try:
@@ -340,51 +969,118 @@ class YOLOInference:
     
     def predict(self, frame: np.ndarray) -> List[Dict]:
         """Run inference on frame"""
-        if self.model is None:
-            return []
+        return self.predict_batch([frame])[0]
+
+    def predict_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Run inference on several frames in one forward pass (one detection list per frame)"""
+        if self.model is None or not frames:
+            return [[] for _ in frames]
         
         try:
-            results = self.model.predict(
-                frame,
+            if self.backend in ('trt', 'onnx') and len(frames) > 1:
+                # Engine TensorRT / model ONNX di-export dengan batch statis 1
+                results = []
+                for frame in frames:
+                    results.extend(self._run_model(frame))
+            else:
+                results = self._run_model(frames)
+            
+            return [self._result_to_detections(result) for result in results]
+            
+        except Exception as e:
+            self.logger.error(f"Inference error: {e}")
+            return [[] for _ in frames]
+
+    def _run_model(self, source):
+        # inference_mode lebih murah dari no_grad (tanpa version counter tracking)
+        with torch.inference_mode():
+            return self.model.predict(
+                source,
                 conf=self.config.MODEL_CONFIDENCE,
                 iou=self.config.MODEL_IOU_THRESHOLD,
                 imgsz=self.config.MODEL_IMGSZ,
+                half=self.half,
                 verbose=False
             )
-            
-            detections = []
-            if results and len(results) > 0:
-                result = results[0]
-                if result.boxes is not None:
-                    boxes = result.boxes
-                    for i in range(len(boxes)):
-                        box = boxes.xywhn[i].cpu().numpy()  # normalized xywh
-                        conf = float(boxes.conf[i].cpu().numpy())
-                        cls = int(boxes.cls[i].cpu().numpy())
-                        label = self.model.names[cls]
-                        
-                        detection = {
-                            "label": label,
-                            "confidence": conf,
-                            "bbox": [float(x) for x in box]  # [x_center, y_center, width, height]
-                        }
-                        detections.append(detection)
-            
-            return detections
-            
-        except Exception as e:
-            self.logger.error(f"Inference error: {e}")
+
+    def _result_to_detections(self, result) -> List[Dict]:
+        """Convert one Ultralytics result into detection dicts"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
             return []
 
+        if self._names_arr is None:
+            names = self.model.names
+            self._names_arr = np.array([names[i] for i in range(len(names))], dtype=object)
+
+        # Satu transfer (dan satu sync) device->host per frame: [x, y, w, h (normalized), conf, cls]
+        data = torch.cat((boxes.xywhn, boxes.data[:, -2:]), dim=1).cpu().numpy()
+        labels = self._names_arr[data[:, 5].astype(np.int32)].tolist()
+        return [
+            {
+                "label": label,
+                "confidence": conf,
+                "bbox": box  # [x_center, y_center, width, height]
+            }
+            for label, conf, box in zip(labels, data[:, 4].tolist(), data[:, :4].tolist())
+        ]
+
+# GStreamer pipelines with NVDEC hardware H.264 decode; queue leaky=2 + appsink drop=1 keep
+# only the newest frame so a slow consumer never builds up latency
+GST_NVDEC_PIPELINES = {
+    # Jetson (L4T): nvv4l2decoder + nvvidconv
+    'nvv4l2decoder': (
+        "rtspsrc location={url} latency=50 ! rtph264depay ! h264parse ! nvv4l2decoder ! "
+        "nvvidconv ! video/x-raw,format=BGRx ! queue leaky=2 max-size-buffers=1 ! "
+        "videoconvert ! video/x-raw,format=BGR ! appsink drop=1 max-buffers=1 sync=false"
+    ),
+    # Desktop/server GPU: nvh264dec from gst-plugins-bad (nvcodec)
+    'nvh264dec': (
+        "rtspsrc location={url} latency=50 ! rtph264depay ! h264parse ! nvh264dec ! "
+        "queue leaky=2 max-size-buffers=1 ! videoconvert ! video/x-raw,format=BGR ! "
+        "appsink drop=1 max-buffers=1 sync=false"
+    ),
+}
+
+def _gst_nvdec_element() -> str:
+    """Pick the NVDEC GStreamer decoder element for this host"""
+    return 'nvv4l2decoder' if Path('/etc/nv_tegra_release').exists() else 'nvh264dec'
+
+def _opencv_has_gstreamer() -> bool:
+    """Check whether this OpenCV build includes the GStreamer backend"""
+    try:
+        for line in cv2.getBuildInformation().splitlines():
+            if 'GStreamer' in line:
+                return 'YES' in line
+    except Exception:
+        pass
+    return False
+
 class CameraManager:
     """RTSP camera manager with reconnection handling"""
-    
-    def __init__(self, rtsp_url: str, camera_id: str, max_retries: int = 6, retry_interval: int = 5):
+
+    # Buang frame lama yang sudah di-buffer lewat grab() (FFmpeg tetap decode, tapi konversi BGR
+    # dan copy di retrieve() dilewati), maksimal MAX_DRAIN_GRABS kali. Satu grab yang blocking lebih
+    # lama dari LIVE_EDGE_FRACTION x interval frame berarti sudah di live edge (menunggu frame baru)
+    MAX_DRAIN_GRABS = 5
+    LIVE_EDGE_FRACTION = 0.5
+    # Batas blocking open/read FFmpeg (default-nya ~30 detik), supaya stop() tidak menunggu stream mati
+    OPEN_TIMEOUT_MS = 10000
+    READ_TIMEOUT_MS = 5000
+
+    def __init__(self, rtsp_url: str, camera_id: str, max_retries: int = 6, retry_interval: int = 5,
+                 decoder: str = 'ffmpeg'):
         self.rtsp_url = rtsp_url
         self.camera_id = camera_id
+        # 'gstreamer' / 'auto' mencoba pipeline NVDEC dulu, 'ffmpeg' langsung VideoCapture(url)
+        self.decoder = decoder
         self.cap = None
         self.connected = False
         self.frame_count = 0
+        # FPS sumber dari stream (fallback 15 jika backend tidak melaporkan)
+        self.source_fps = 15.0
+        # Buffer BGR yang dipakai ulang oleh retrieve(); isinya ditimpa tiap read_frame
+        self._frame_buf = None
         self.logger = logging.getLogger(__name__ + f'.Camera.{camera_id}')
 
         # Auto-disable handling
@@ -398,10 +1094,13 @@ class CameraManager:
     def _connect(self):
         """Connect to RTSP stream"""
         try:
-            self.cap = cv2.VideoCapture(self.rtsp_url)
+            self.cap = self._open_capture()
             if self.cap.isOpened():
                 self.connected = True
                 self.failure_count = 0
+                fps = self.cap.get(cv2.CAP_PROP_FPS)
+                if 0 < fps <= 120:
+                    self.source_fps = fps
                 self.logger.info(f"Connected to camera: {self.rtsp_url}")
             else:
                 self.connected = False
@@ -418,8 +1117,59 @@ class CameraManager:
                 self.disabled = True
                 self.logger.warning(f"Camera {self.camera_id} disabled after repeated connection errors")
     
-    def read_frame(self) -> Optional[np.ndarray]:
-        """Read frame from camera with reconnection handling"""
+    def _open_capture(self):
+        """Open the RTSP stream, preferring the NVDEC GStreamer pipeline when configured"""
+        use_gst = self.decoder == 'gstreamer' or (self.decoder == 'auto' and _opencv_has_gstreamer())
+        if use_gst:
+            element = _gst_nvdec_element()
+            pipeline = GST_NVDEC_PIPELINES[element].format(url=self.rtsp_url)
+            cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if cap.isOpened():
+                self.logger.info(f"Using GStreamer NVDEC pipeline ({element})")
+                return cap
+            cap.release()
+            self.logger.warning("GStreamer NVDEC pipeline unavailable; falling back to FFmpeg backend")
+        cap = None
+        if hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC'):
+            cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.OPEN_TIMEOUT_MS,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.READ_TIMEOUT_MS,
+            ])
+            if not cap.isOpened():
+                # Build OpenCV tanpa FFmpeg: biarkan OpenCV memilih backend sendiri
+                cap.release()
+                cap = None
+        if cap is None:
+            cap = cv2.VideoCapture(self.rtsp_url)
+        # Keep only the newest decoded frame so slow inference doesn't build up lag
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _grab_latest(self, max_skip: Optional[int] = None) -> bool:
+        """Grab (decode, without BGR conversion) buffered frames until the live edge is reached"""
+        if not self.cap.grab():
+            return False
+        # Frame yang sudah di-buffer kembali secepat decode-nya; di live edge grab menunggu frame baru.
+        # max_skip dari caller memperkirakan backlog yang memang ada, jadi hanya berhenti jika satu grab
+        # menunggu satu interval frame penuh (decode lambat tidak lagi memotong drain)
+        fraction = self.LIVE_EDGE_FRACTION if max_skip is None else 1.0
+        live_edge = fraction / self.source_fps
+        for _ in range(self.MAX_DRAIN_GRABS if max_skip is None else max_skip):
+            start = time.monotonic()
+            if not self.cap.grab():
+                break
+            if time.monotonic() - start > live_edge:
+                break
+        return True
+
+    def read_frame(self, max_skip: Optional[int] = None) -> Optional[np.ndarray]:
+        """Read frame from camera with reconnection handling
+
+        max_skip is how many buffered frames to drop first (grabbed and decoded, but not converted
+        to BGR); dropping stops early only once a grab waits a full frame interval (live edge).
+        The returned array is reused by the next call; copy it before handing it off, or call
+        detach_frame_buffer() if something may still read it after the next call.
+        """
         if self.disabled:
             # Camera permanently disabled; do not attempt further reads
             return None
@@ -433,7 +1183,12 @@ class CameraManager:
             return None
         
         try:
-            ret, frame = self.cap.read()
+            ret = self._grab_latest(max_skip)
+            frame = None
+            if ret:
+                ret, frame = self.cap.retrieve(self._frame_buf)
+                if ret:
+                    self._frame_buf = frame
             if ret:
                 self.frame_count += 1
                 return frame
@@ -446,6 +1201,10 @@ class CameraManager:
             self.connected = False
             return None
     
+    def detach_frame_buffer(self):
+        """Leave the last returned frame to its current holder; the next read allocates a new buffer"""
+        self._frame_buf = None
+
     def release(self):
         """Release camera resources"""
         if self.cap:
@@ -455,20 +1214,64 @@ class CameraManager:
         self.disabled = True
 
 
+# Opsi encoder per codec untuk ProcessPublisher (bitrate/GOP ditambahkan terpisah)
+PUBLISH_ENCODER_ARGS = {
+    # llhp dikenali FFmpeg lama (4.2 di Ubuntu 20.04) maupun baru; preset p1-p7 / -tune butuh FFmpeg 4.4+
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'llhp', '-rc', 'cbr'],
+    'h264_v4l2m2m': ['-c:v', 'h264_v4l2m2m'],
+    'libx264': ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency'],
+}
+
+@functools.lru_cache(maxsize=None)
+def detect_publish_encoder(preferred: str = 'auto') -> str:
+    """Probe FFmpeg once and return the first H.264 encoder that can actually encode a test frame"""
+    logger = logging.getLogger(__name__)
+    if preferred != 'auto':
+        return preferred if preferred in PUBLISH_ENCODER_ARGS else 'libx264'
+
+    import subprocess
+    for encoder in ('h264_nvenc', 'h264_v4l2m2m'):
+        if encoder == 'h264_v4l2m2m' and not Path('/etc/nv_tegra_release').exists():
+            # Encoder V4L2 M2M hanya dipakai di Jetson
+            continue
+        try:
+            # Encoder bisa ter-compile di FFmpeg tanpa hardware-nya; uji encode satu frame
+            # dengan opsi yang persis sama dengan yang dipakai publisher
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                 '-i', 'color=c=black:s=256x256', '-frames:v', '1',
+                 *PUBLISH_ENCODER_ARGS[encoder], '-f', 'null', '-'],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=10
+            )
+            if result.returncode == 0:
+                logger.info(f"ProcessPublisher using hardware encoder {encoder}")
+                return encoder
+        except Exception:
+            pass
+    logger.info("ProcessPublisher using software encoder libx264")
+    return 'libx264'
+
 class ProcessPublisher:
     """Publish processed frames to RTSP server using FFmpeg via stdin.
 
     Usage: create per-camera publisher; call write_frame(bgr_frame) for each
     processed frame. Publisher is started lazily when first frame arrives.
     """
-    def __init__(self, camera_id: str, rtsp_host: str = 'rtsp-server', rtsp_port: int = 8554):
+    def __init__(self, camera_id: str, rtsp_host: str = 'rtsp-server', rtsp_port: int = 8554,
+                 encoder: str = 'libx264'):
         self.camera_id = camera_id
         self.rtsp_host = rtsp_host
         self.rtsp_port = rtsp_port
+        self.encoder = encoder
         self.process = None
         self.width = None
         self.height = None
         self.framerate = 15
+        # Frame antrean ke writer thread; penuh = encoder/jaringan tertinggal, frame dibuang
+        self.queue: queue.Queue = queue.Queue(maxsize=2)
+        self.dropped = 0
+        self._writer = None
 
     def start(self, width: int, height: int):
         if self.process:
@@ -485,9 +1288,7 @@ class ProcessPublisher:
             '-s', f'{self.width}x{self.height}',
             '-r', str(self.framerate),
             '-i', '-',
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-tune', 'zerolatency',
+            *PUBLISH_ENCODER_ARGS[self.encoder],
             '-pix_fmt', 'yuv420p',
             '-g', '30',  # keyframe every 30 frames
             '-b:v', '1M',  # 1Mbps bitrate
@@ -528,9 +1329,45 @@ class ProcessPublisher:
             self.process = None
 
     def write_frame(self, frame) -> bool:
-        """Write a BGR frame (numpy array) to ffmpeg stdin. Returns False on failure."""
+        """Queue a BGR frame (numpy array) for the writer thread. Returns False if it was dropped."""
         if frame is None:
             return False
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name=f'publish-{self.camera_id}', daemon=True)
+            self._writer.start()
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _writer_loop(self):
+        """Drain the frame queue into ffmpeg stdin so slow writes never block the caller"""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                # Sentinel dari close()
+                return
+            try:
+                if not self._write(frame):
+                    logging.getLogger(__name__).debug(f"Failed to stream frame for {self.camera_id}_proc")
+            except Exception as e:
+                logging.getLogger(__name__).debug(f"Exception streaming frame for {self.camera_id}_proc: {e}")
+
+    def _write_raw(self, frame):
+        """Write raw BGR bytes without an intermediate tobytes() copy"""
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        self.process.stdin.write(memoryview(frame).cast('B'))
+        # flush to ensure ffmpeg receives the input promptly and to detect broken pipes
+        try:
+            self.process.stdin.flush()
+        except Exception:
+            pass
+
+    def _write(self, frame) -> bool:
+        """Write one frame to ffmpeg stdin, starting/restarting the process as needed"""
         h, w = frame.shape[:2]
         if not self.process:
             logging.getLogger(__name__).info(f"Starting ProcessPublisher on first frame for {self.camera_id}_proc ({w}x{h})")
@@ -550,12 +1387,7 @@ class ProcessPublisher:
 
             # Write raw BGR bytes
             try:
-                self.process.stdin.write(frame.tobytes())
-                # flush to ensure ffmpeg receives the input promptly and to detect broken pipes
-                try:
-                    self.process.stdin.flush()
-                except Exception:
-                    pass
+                self._write_raw(frame)
             except BrokenPipeError:
                 logging.getLogger(__name__).warning(f"Broken pipe when writing frame for {self.camera_id}_proc - restarting publisher")
                 # Attempt to restart publisher once
@@ -564,11 +1396,7 @@ class ProcessPublisher:
                 if not self.process:
                     return False
                 try:
-                    self.process.stdin.write(frame.tobytes())
-                    try:
-                        self.process.stdin.flush()
-                    except Exception:
-                        pass
+                    self._write_raw(frame)
                 except Exception as e:
                     logging.getLogger(__name__).error(f"Retry write failed for {self.camera_id}_proc: {e}")
                     return False
@@ -582,6 +1410,25 @@ class ProcessPublisher:
                 pass
             return False
 
+    def close(self):
+        """Stop the writer thread and the ffmpeg process for good"""
+        if self._writer is not None:
+            # Buang frame yang belum ditulis supaya sentinel pasti masuk
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put(None)
+            self._writer.join(timeout=5)
+        process = self.process
+        self.stop()
+        if process is not None:
+            try:
+                process.wait(timeout=5)
+            except Exception:
+                process.kill()
+
     def stop(self):
         try:
             if self.process:
@@ -598,6 +1445,52 @@ class ProcessPublisher:
         except Exception:
             pass
 
+class StreamViewerMonitor:
+    """Poll rtsp-simple-server's API for the number of readers on each path"""
+
+    def __init__(self, api_url: str, poll_interval: float = 2.0):
+        self.api_url = api_url.rstrip('/')
+        self.poll_interval = poll_interval
+        self.readers: Dict[str, int] = {}
+        self.available = False
+        self.logger = logging.getLogger(__name__ + '.ViewerMonitor')
+        self._thread = threading.Thread(target=self._run, name='viewer-monitor', daemon=True)
+        self._thread.start()
+
+    def has_viewers(self, path: str) -> bool:
+        """True if the path has readers (or if the API can't be reached)"""
+        if not self.available:
+            return True
+        return self.readers.get(path, 0) > 0
+
+    def _poll(self):
+        import urllib.request
+        with urllib.request.urlopen(f"{self.api_url}/v1/paths/list", timeout=1) as resp:
+            data = json.loads(resp.read())
+        items = data.get('items', {})
+        # v0.x mengembalikan dict {name: info}, versi mediamtx baru list [{name, readers}]
+        if isinstance(items, dict):
+            items = [dict(info, name=name) for name, info in items.items()]
+        self.readers = {item.get('name'): len(item.get('readers') or []) for item in items}
+
+    def _run(self):
+        while True:
+            try:
+                self._poll()
+                if not self.available:
+                    self.logger.info(f"Viewer monitor connected to {self.api_url}")
+                self.available = True
+            except Exception as e:
+                if self.available:
+                    self.logger.warning(f"Viewer monitor unavailable, publishing unconditionally: {e}")
+                self.available = False
+            time.sleep(self.poll_interval)
+
+# Max seconds a camera thread waits for its batched inference result
+BATCH_RESULT_TIMEOUT = 10
+# Seconds between camera_status UPSERTs
+CAMERA_STATUS_INTERVAL = 5
+
 class InferenceService:
     """Main inference service orchestrator"""
     
@@ -616,12 +1509,44 @@ class InferenceService:
         self.db_manager = DatabaseManager(self.config)
         self.mqtt_manager = MQTTManager(self.config)
         self.yolo = YOLOInference(self.config)
+        if self.mqtt_manager.use_msgpack and self.yolo.model is not None:
+            self.mqtt_manager.label_ids = {name: int(idx) for idx, name in self.yolo.model.names.items()}
         self.cameras: Dict[str, CameraManager] = {}
-        self.executor = ThreadPoolExecutor(max_workers=self.config.MAX_WORKERS)
+        self.publishers: Dict[str, ProcessPublisher] = {}
+        # Satu worker per kamera: _process_camera berjalan selama service hidup
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.config.CAMERA_COUNT), thread_name_prefix='cam')
+        # Annotate + encode processed frames off the camera/inference threads
+        self.publish_executor = ThreadPoolExecutor(max_workers=max(1, self.config.CAMERA_COUNT),
+                                                   thread_name_prefix='publish')
+        self.viewer_monitor = StreamViewerMonitor(self.config.RTSP_API_URL) if self.config.RTSP_API_URL else None
+        
+        # Batched inference: camera threads push (camera_id, seq, frame), one loop runs YOLO on the batch
+        # and answers with (seq, detections)
+        self.batch_queue: queue.Queue = queue.Queue()
+        self.result_queues: Dict[str, queue.Queue] = {}
+        # Nomor request terakhir per kamera, dan request yang masih ditunggu (None setelah timeout)
+        self._infer_seq: Dict[str, int] = {}
+        self._pending_seq: Dict[str, Optional[int]] = {}
+        self._batch_thread = None
         
         # Performance monitoring
-        self.fps_counters = {}
-        self.last_fps_check = time.time()
+        # FPS counters per kamera: _fps_arr[_cam_index[camera_id]] = [count, last_ns]
+        self._cam_index: Dict[str, int] = {}
+        self._fps_arr: List[List[int]] = []
+        # EMA periode inferensi per kamera (detik), dasar adaptive frame skip
+        self.ema_latency: Dict[str, float] = {}
+        self._stats_thread = None
+        # Statistik camera_status di memori: _cam_stat[camera_id] = [frames, detections, last_ns],
+        # di-UPSERT ke DB tiap CAMERA_STATUS_INTERVAL detik
+        self._cam_stat: Dict[str, List[int]] = {}
+        # Melindungi _cam_stat: += dari thread kamera dan baca-lalu-reset dari status thread
+        self._cam_stat_lock = threading.Lock()
+        self._status_thread = None
+        # Di-set stop(): camera/stats threads keluar cooperatively, sleep mereka langsung bangun
+        self._stop_evt = threading.Event()
+        # Handle proses sendiri di-cache; panggilan pertama cpu_percent hanya priming
+        self._proc = psutil.Process()
+        self._proc.cpu_percent(interval=None)
         
         self._setup_signal_handlers()
     
@@ -700,109 +1625,269 @@ class InferenceService:
                 rtsp_url, camera_id,
                 max_retries=self.config.CAMERA_MAX_RETRIES,
                 retry_interval=self.config.CAMERA_RETRY_INTERVAL,
+                decoder=self.config.RTSP_DECODER,
             )
-            self.fps_counters[camera_id] = {"count": 0, "last_time": time.time()}
+            self._cam_index[camera_id] = len(self._fps_arr)
+            self._fps_arr.append([0, time.monotonic_ns()])
+            self._cam_stat[camera_id] = [0, 0, time.monotonic_ns()]
+            self.result_queues[camera_id] = queue.Queue()
+            self._infer_seq[camera_id] = 0
+            self._pending_seq[camera_id] = None
     
     def _process_camera(self, camera_id: str):
         """Process frames from a single camera"""
         camera = self.cameras[camera_id]
         frame_skip_counter = 0
+        last_infer = None
+        prev_small = None
+        static_frames = 0
+        self.ema_latency[camera_id] = 0.0
         # Publisher for processed frames (streams to rtsp-server as <camera_id>_proc)
-        publisher = ProcessPublisher(camera_id, rtsp_host='rtsp-server', rtsp_port=8554)
+        publisher = ProcessPublisher(camera_id, rtsp_host='rtsp-server', rtsp_port=8554,
+                                     encoder=detect_publish_encoder(self.config.PUBLISH_ENCODER))
+        self.publishers[camera_id] = publisher
+        publish_future = None
+        last_publish = 0.0
 
-        while self.running:
+        while self.running and not self._stop_evt.is_set():
             try:
                 # Exit the loop if camera has been auto-disabled
                 if camera.disabled:
                     self.logger.info(f"Camera {camera_id} is disabled; stopping processing thread")
                     return
-                frame = camera.read_frame()
+                if self.config.ADAPTIVE_FRAME_SKIP:
+                    # Frame yang datang selama satu periode inferensi dibuang via grab() (tanpa retrieve)
+                    target_skip = max(0, int(self.ema_latency[camera_id] * camera.source_fps) - 1)
+                    frame = camera.read_frame(max_skip=target_skip)
+                else:
+                    frame = camera.read_frame()
                 if frame is None:
-                    time.sleep(self.config.RTSP_RECONNECT_INTERVAL)
+                    self._stop_evt.wait(self.config.RTSP_RECONNECT_INTERVAL)
                     continue
                 
+                # Update FPS counter (every decoded frame, so it reflects the camera rate)
+                self._update_fps_counter(camera_id)
+                cam_stat = self._cam_stat[camera_id]
+                with self._cam_stat_lock:
+                    cam_stat[0] += 1
+                
                 # Frame skipping for performance
-                frame_skip_counter += 1
-                if frame_skip_counter % (self.config.FRAME_SKIP + 1) != 0:
-                    continue
+                if not self.config.ADAPTIVE_FRAME_SKIP:
+                    frame_skip_counter += 1
+                    if frame_skip_counter % (self.config.FRAME_SKIP + 1) != 0:
+                        continue
                 
-                # Run inference
-                detections = self.yolo.predict(frame)
+                # Motion gate: scene statis cukup diinferensi sesekali
+                if self.config.MOTION_THRESHOLD > 0:
+                    small = cv2.cvtColor(cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA),
+                                         cv2.COLOR_BGR2GRAY)
+                    static = prev_small is not None and cv2.absdiff(small, prev_small).mean() < self.config.MOTION_THRESHOLD
+                    prev_small = small
+                    if static:
+                        static_frames += 1
+                        if static_frames % (self.config.MOTION_SKIP_FRAMES + 1) != 0:
+                            # Periode inferensi (EMA) hanya diukur antar inferensi berturut-turut
+                            last_infer = None
+                            continue
+                    else:
+                        static_frames = 0
                 
-                # Update FPS counter
-                self._update_fps_counter(camera_id)
+                # Run inference (batched with other cameras)
+                detections = self._infer(camera_id, frame)
+                
+                now = time.monotonic()
+                if last_infer is not None:
+                    elapsed = now - last_infer
+                    ema = self.ema_latency[camera_id]
+                    self.ema_latency[camera_id] = elapsed if ema == 0.0 else 0.9 * ema + 0.1 * elapsed
+                last_infer = now
                 
                 if detections:
                     self.logger.debug(f"Camera {camera_id}: {len(detections)} detections")
+                    with self._cam_stat_lock:
+                        cam_stat[1] += len(detections)
 
                     # Publish to MQTT
-                    self.mqtt_manager.publish_detection(camera_id, detections)
-
-                    # Log to database
-                    for detection in detections:
-                        self.db_manager.log_detection(
-                            camera_id,
-                            camera.frame_count,
-                            detection["label"],
-                            detection["confidence"],
-                            detection["bbox"]
-                        )
-
-                # Draw boxes on frame for publishing to SFU
-                try:
-                    import cv2
-                    for det in detections:
-                        x_center, y_center, w_norm, h_norm = det['bbox']
-                        h, w = frame.shape[:2]
-                        x = int((x_center - w_norm/2) * w)
-                        y = int((y_center - h_norm/2) * h)
-                        ww = int(w_norm * w)
-                        hh = int(h_norm * h)
-                        cv2.rectangle(frame, (x, y), (x+ww, y+hh), (0,255,0), 2)
-                        cv2.putText(frame, f"{det['label']}:{det['confidence']:.2f}", (x, max(0,y-6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
-                except Exception as e:
-                    self.logger.debug(f"Failed to draw boxes for {camera_id}: {e}")
+                    self.mqtt_manager.publish_detection(camera_id, detections, camera.frame_count)
 
-                # Always stream processed frame to RTSP server (with or without detections)
-                try:
-                    success = publisher.write_frame(frame)
-                    if not success:
-                        self.logger.debug(f"Failed to stream frame for {camera_id}")
-                except Exception as e:
-                    self.logger.debug(f"Exception streaming frame for {camera_id}: {e}")
+                    # Log to database (di-buffer, flusher thread melakukan executemany)
+                    self.db_manager.log_detections_batch(camera_id, camera.frame_count, detections)
+
+                # Annotate + publish in the background; drop the frame if the previous one is still encoding
+                if publish_future is None or publish_future.done():
+                    now = time.monotonic()
+                    watched = self.viewer_monitor is None or self.viewer_monitor.has_viewers(f"{camera_id}_proc")
+                    if watched or now - last_publish >= self.config.PUBLISH_IDLE_INTERVAL:
+                        last_publish = now
+                        # read_frame reuses its buffer, so the worker draws on its own copy
+                        publish_future = self.publish_executor.submit(
+                            self._annotate_and_publish, camera_id, frame.copy(), detections, publisher)
                 
                 # Rate limiting
-                time.sleep(self.config.INFERENCE_INTERVAL)
+                self._stop_evt.wait(self.config.INFERENCE_INTERVAL)
                 
             except Exception as e:
                 self.logger.error(f"Error processing camera {camera_id}: {e}")
-                time.sleep(1)
+                self._stop_evt.wait(1)
     
+    def _annotate_and_publish(self, camera_id: str, frame: np.ndarray, detections: List[Dict],
+                              publisher: ProcessPublisher):
+        """Draw detection boxes on the frame and stream it to the RTSP server"""
+        # Draw boxes on frame for publishing to SFU
+        try:
+            if detections:
+                h, w = frame.shape[:2]
+                scale = np.array([w, h, w, h], dtype=np.float32)
+                bboxes = np.array([d['bbox'] for d in detections], dtype=np.float32)
+                # xywhn -> pixel x1, y1, x2, y2 untuk semua deteksi sekaligus
+                xyxy = np.concatenate((bboxes[:, :2] - bboxes[:, 2:] / 2,
+                                       bboxes[:, :2] + bboxes[:, 2:] / 2), axis=1)
+                boxes = (xyxy * scale).astype(np.int32).tolist()
+                for det, (x1, y1, x2, y2) in zip(detections, boxes):
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0,255,0), 2)
+                    cv2.putText(frame, f"{det['label']}:{det['confidence']:.2f}", (x1, max(0,y1-6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
+        except Exception as e:
+            self.logger.debug(f"Failed to draw boxes for {camera_id}: {e}")
+
+        # Stream processed frame to RTSP server (with or without detections)
+        try:
+            success = publisher.write_frame(frame)
+            if not success:
+                self.logger.debug(f"Failed to stream frame for {camera_id}")
+        except Exception as e:
+            self.logger.debug(f"Exception streaming frame for {camera_id}: {e}")
+
+    def _infer(self, camera_id: str, frame: np.ndarray) -> List[Dict]:
+        """Submit a frame to the shared batch loop and wait for its detections"""
+        results = self.result_queues[camera_id]
+        seq = self._infer_seq[camera_id] + 1
+        self._infer_seq[camera_id] = seq
+        self._pending_seq[camera_id] = seq
+
+        self.batch_queue.put((camera_id, seq, frame))
+        deadline = time.monotonic() + BATCH_RESULT_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result_seq, detections = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            # Hasil basi dari request yang sebelumnya timeout dibuang
+            if result_seq == seq:
+                self._pending_seq[camera_id] = None
+                return detections
+
+        # Batalkan request ini: batch loop melewatinya jika belum diambil, hasil yang telat dibuang
+        self._pending_seq[camera_id] = None
+        # Batch thread mungkin masih membaca (np.copyto) frame ini; retrieve() berikutnya jangan menimpanya
+        self.cameras[camera_id].detach_frame_buffer()
+        self.logger.warning(f"Camera {camera_id}: timed out waiting for batched inference")
+        return []
+
+    def _batch_inference_loop(self):
+        """Collect frames from all cameras and run them through YOLO as one batch"""
+        while self.running:
+            try:
+                batch = [self.batch_queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # Kamera yang disabled tidak akan mengirim frame, jangan ditunggu
+            max_batch = self.config.MAX_BATCH or max(1, sum(not cam.disabled for cam in self.cameras.values()))
+            # Tunggu frame kamera lain paling lama BATCH_WAIT
+            deadline = time.monotonic() + self.config.BATCH_WAIT
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.batch_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Lewati request yang sudah dibatalkan karena timeout
+            batch = [item for item in batch if self._pending_seq.get(item[0]) == item[1]]
+            if not batch:
+                continue
+
+            try:
+                results = self.yolo.predict_batch([frame for _, _, frame in batch])
+            except Exception as e:
+                self.logger.error(f"Batched inference error: {e}")
+                results = [[] for _ in batch]
+
+            for (camera_id, seq, _), detections in zip(batch, results):
+                self.result_queues[camera_id].put((seq, detections))
+
     def _update_fps_counter(self, camera_id: str):
         """Update FPS counter for monitoring"""
-        current_time = time.time()
-        self.fps_counters[camera_id]["count"] += 1
-        
-        if current_time - self.last_fps_check > 30:  # Log every 30 seconds
-            self._log_performance_stats()
-            self.last_fps_check = current_time
+        self._fps_arr[self._cam_index[camera_id]][0] += 1
+    
+    def _stats_loop(self):
+        """Log performance statistics every 30 seconds, off the camera threads"""
+        while not self._stop_evt.wait(30):
+            try:
+                self._log_performance_stats()
+            except Exception as e:
+                self.logger.debug(f"Failed to log performance stats: {e}")
     
+    def _camera_status_loop(self):
+        """Write camera_status every CAMERA_STATUS_INTERVAL seconds instead of per frame"""
+        while not self._stop_evt.wait(CAMERA_STATUS_INTERVAL):
+            try:
+                self._flush_camera_status()
+            except Exception as e:
+                self.logger.debug(f"Failed to flush camera status: {e}")
+        # Kembalikan koneksi thread ini supaya db_manager.close() bisa menutupnya
+        self.db_manager.release_thread_connection()
+
+    def _flush_camera_status(self):
+        """UPSERT one camera_status row per camera from the in-memory counters"""
+        now_ns = time.monotonic_ns()
+        rows = []
+        for camera_id, stat in self._cam_stat.items():
+            # Baca dan reset di bawah lock yang sama dengan increment di thread kamera
+            with self._cam_stat_lock:
+                frames, detections, last_ns = stat
+                stat[0] = 0
+                stat[1] = 0
+                stat[2] = now_ns
+            camera = self.cameras[camera_id]
+            if camera.disabled:
+                status = 'error'
+            elif camera.connected:
+                status = 'online'
+            else:
+                status = 'offline'
+            fps = frames * 1e9 / max(1, now_ns - last_ns)
+            rows.append((camera_id, status, round(fps, 2), detections))
+        self.db_manager.update_camera_status(rows)
+
     def _log_performance_stats(self):
         """Log performance statistics"""
-        current_time = time.time()
-        
-        for camera_id, counter in self.fps_counters.items():
-            elapsed = current_time - counter["last_time"]
-            if elapsed > 0:
-                fps = counter["count"] / elapsed
-                self.logger.info(f"Camera {camera_id}: {fps:.2f} FPS")
-                counter["count"] = 0
-                counter["last_time"] = current_time
-        
-        # System resource usage
-        cpu_percent = psutil.cpu_percent()
+        now_ns = time.monotonic_ns()
+        
+        for camera_id, idx in self._cam_index.items():
+            counter = self._fps_arr[idx]
+            elapsed_ns = now_ns - counter[1]
+            if elapsed_ns > 0:
+                fps = counter[0] * 1e9 / elapsed_ns
+                publisher = self.publishers.get(camera_id)
+                dropped = publisher.dropped if publisher else 0
+                self.logger.info(f"Camera {camera_id}: {fps:.2f} FPS, {dropped} published frames dropped")
+                counter[0] = 0
+                counter[1] = now_ns
+        
+        # Resource usage: CPU proses ini (satu baca /proc/self/stat) + memori sistem
+        try:
+            # interval=None: delta sejak panggilan sebelumnya, tidak memblokir
+            cpu_percent = self._proc.cpu_percent(interval=None)
+        except psutil.NoSuchProcess:
+            return
         memory_percent = psutil.virtual_memory().percent
-        self.logger.info(f"System: CPU {cpu_percent:.1f}%, Memory {memory_percent:.1f}%")
+        self.logger.info(f"Process CPU {cpu_percent:.1f}%, System memory {memory_percent:.1f}%")
     
     def start(self):
         """Start the inference service"""
@@ -819,6 +1904,18 @@ class InferenceService:
         else:
             self.logger.info(f"Connected cameras: {connected_cameras}")
         
+        # Start the shared batched inference loop
+        self._batch_thread = threading.Thread(target=self._batch_inference_loop, name='yolo-batch', daemon=True)
+        self._batch_thread.start()
+        
+        # Performance stats are logged from their own thread
+        self._stats_thread = threading.Thread(target=self._stats_loop, name='perf-stats', daemon=True)
+        self._stats_thread.start()
+        
+        if self.db_manager.enabled:
+            self._status_thread = threading.Thread(target=self._camera_status_loop, name='camera-status', daemon=True)
+            self._status_thread.start()
+        
         # Start processing threads for each camera
         futures = []
         for camera_id in self.cameras:
@@ -827,33 +1924,53 @@ class InferenceService:
         
         self.logger.info("Inference service started successfully")
         
-        # Wait for all threads
+        # Wait for all threads; report each camera worker failure as soon as it happens
         try:
-            for future in futures:
-                future.result()
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    if future.exception() is not None:
+                        self.logger.error(f"Camera worker failed: {future.exception()}")
         except KeyboardInterrupt:
             self.stop()
     
     def stop(self):
         """Stop the inference service"""
+        # Signal handler dan main() sama-sama memanggil stop()
+        if self._stop_evt.is_set():
+            return
         self.logger.info("Stopping inference service...")
+        self._stop_evt.set()
         self.running = False
         
+        # Tunggu camera threads keluar dulu; release() saat read() masih berjalan bisa hang di FFmpeg
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.publish_executor.shutdown(wait=True, cancel_futures=True)
+        
         # Release camera resources
         for camera in self.cameras.values():
             camera.release()
         
-        # Shutdown executor
-        self.executor.shutdown(wait=True)
+        # Stop processed-stream writers and their ffmpeg children
+        for publisher in self.publishers.values():
+            publisher.close()
         
         # Disconnect MQTT
-        if self.mqtt_manager.connected:
-            self.mqtt_manager.client.loop_stop()
-            self.mqtt_manager.client.disconnect()
+        self.mqtt_manager.close()
+        
+        # Tulis statistik camera_status terakhir (maks. CAMERA_STATUS_INTERVAL detik) sebelum DB ditutup
+        if self._status_thread is not None:
+            self._status_thread.join(timeout=5)
+            try:
+                self._flush_camera_status()
+            except Exception as e:
+                self.logger.debug(f"Failed to flush camera status: {e}")
+            self.db_manager.release_thread_connection()
         
         # Close database connection
-        if self.db_manager.connection:
-            self.db_manager.connection.close()
+        if self.db_manager.pool:
+            self.db_manager.close()
         
         self.logger.info("Inference service stopped")
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Export YOLO weights to a TensorRT FP16 engine for the inference service
+Point MODEL_PATH at the resulting .engine file to load it directly at startup
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from ultralytics import YOLO
+
+def main():
+    parser = argparse.ArgumentParser(description='Export YOLO .pt weights to a TensorRT engine')
+    parser.add_argument('weights', nargs='?', default='./models/yolov12n.pt', help='Path to .pt weights')
+    parser.add_argument('--imgsz', type=int, default=640, help='Input size (must match MODEL_IMGSZ)')
+    parser.add_argument('--device', default='0', help='CUDA device index')
+    parser.add_argument('--workspace', type=int, default=4, help='TensorRT workspace size (GB)')
+    parser.add_argument('--fp32', action='store_true', help='Build an FP32 engine instead of FP16')
+    args = parser.parse_args()
+
+    weights = Path(args.weights)
+    if not weights.exists():
+        print(f"Weights not found: {weights}")
+        sys.exit(1)
+
+    print(f"Exporting {weights} to TensorRT ({'FP32' if args.fp32 else 'FP16'}, imgsz={args.imgsz})...")
+    engine = YOLO(str(weights)).export(
+        format='engine',
+        half=not args.fp32,
+        imgsz=args.imgsz,
+        device=args.device,
+        workspace=args.workspace
+    )
+    print(f"Engine written to {engine}")
+    print(f"Set MODEL_PATH={engine} (and MODEL_IMGSZ={args.imgsz}) to use it")
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,11 @@ def main():
                 prop = torch.cuda.get_device_properties(i)
                 print(f'device {i}:', name)
                 print(f'  total memory (GB): {prop.total_memory / (1024**3):.2f}')
+                major, minor = torch.cuda.get_device_capability(i)
+                print(f'  compute capability: {major}.{minor}')
+                # FP16 tensor cores from SM 7.0 (Volta), INT8 tensor cores from SM 7.5 (Turing)
+                print(f'  fp16 tensor cores: {(major, minor) >= (7, 0)}')
+                print(f'  int8 tensor cores: {(major, minor) >= (7, 5)}')
         except Exception as e:
             print('error inspecting CUDA devices:', e)
             sys.exit(2)
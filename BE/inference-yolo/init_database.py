@@ -2,16 +2,29 @@
 """
 Database initialization script for YOLOv12 Inference Service
 Creates database and tables if they don't exist
+
+The inference service commits detections once per batched flush. If losing up to ~1s of
+detections on a MySQL crash is acceptable, set innodb_flush_log_at_trx_commit=2 on the
+server (e.g. `--innodb-flush-log-at-trx-commit=2`) to avoid an fsync per commit.
 """
 
 import mysql.connector
 import os
 import sys
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+try:
+    # Prefer the C extension (_mysql_connector) over the pure-Python protocol
+    import mysql.connector.connection_cext  # noqa: F401
+    USE_PURE = False
+except ImportError:
+    print("Warning: mysql-connector C extension not available; using the pure-Python protocol")
+    USE_PURE = True
+
 def create_database():
     """Create database and tables"""
     
@@ -29,7 +42,8 @@ def create_database():
             host=DB_HOST,
             port=DB_PORT,
             user=DB_USER,
-            password=DB_PASSWORD
+            password=DB_PASSWORD,
+            use_pure=USE_PURE
         )
         
         cursor = connection.cursor()
@@ -41,11 +55,14 @@ def create_database():
         # Use the database
         cursor.execute(f"USE {DB_NAME}")
         
-        # Create detections table
+        # Create detections table (secondary indexes on label/confidence are deferred to
+        # create_indexes() so bulk inserts only maintain the PK and idx_camera_timestamp)
         print("Creating detections table...")
+        # Partitioned by day on timestamp (see rotate_partitions()); TIMESTAMP columns only
+        # allow UNIX_TIMESTAMP() in the partition expression, and the PK must include it
         create_table_query = """
         CREATE TABLE IF NOT EXISTS detections (
-            id INT AUTO_INCREMENT PRIMARY KEY,
+            id INT AUTO_INCREMENT,
             camera_id VARCHAR(50) NOT NULL,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             frame_seq INT,
@@ -55,10 +72,13 @@ def create_database():
             bbox_y_center FLOAT NOT NULL,
             bbox_width FLOAT NOT NULL,
             bbox_height FLOAT NOT NULL,
-            INDEX idx_camera_timestamp (camera_id, timestamp),
-            INDEX idx_label (label),
-            INDEX idx_confidence (confidence)
+            PRIMARY KEY (id, timestamp),
+            INDEX idx_camera_timestamp (camera_id, timestamp)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+            PARTITION p_init VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01 00:00:00')),
+            PARTITION p_future VALUES LESS THAN MAXVALUE
+        )
         """
         
         cursor.execute(create_table_query)
@@ -123,6 +143,191 @@ def create_database():
         print(f"Unexpected error: {e}")
         sys.exit(1)
 
+def create_indexes():
+    """Add the secondary detections indexes (run after the initial bulk load / backfill)"""
+    
+    DB_HOST = os.getenv('DB_HOST', 'localhost')
+    DB_PORT = int(os.getenv('DB_PORT', '3307'))
+    DB_USER = os.getenv('DB_USER', 'root')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    DB_NAME = os.getenv('DB_NAME', 'yolo_detections')
+    
+    indexes = {
+        'idx_label': 'label',
+        'idx_confidence': 'confidence',
+    }
+    
+    try:
+        connection = mysql.connector.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            use_pure=USE_PURE
+        )
+        cursor = connection.cursor()
+        
+        cursor.execute("SHOW INDEX FROM detections")
+        existing = {row[2] for row in cursor.fetchall()}
+        for name, column in indexes.items():
+            if name in existing:
+                print(f"Index {name} already exists")
+                continue
+            print(f"Creating index {name} on detections({column})...")
+            cursor.execute(f"CREATE INDEX {name} ON detections({column})")
+        
+        print("Secondary indexes ready")
+        cursor.close()
+        connection.close()
+        
+    except Exception as e:
+        print(f"Index creation failed: {e}")
+        sys.exit(1)
+
+def rotate_partitions(days_ahead: int = 2):
+    """Split daily partitions off p_future and drop ones older than DB_RETENTION_DAYS (run daily, e.g. cron)
+
+    The first run splits everything before today into p_hist. REORGANIZE PARTITION copies the
+    rows of p_future, so on a large table run it off-peak. Later runs only split empty
+    future days and are cheap.
+    """
+    
+    DB_HOST = os.getenv('DB_HOST', 'localhost')
+    DB_PORT = int(os.getenv('DB_PORT', '3307'))
+    DB_USER = os.getenv('DB_USER', 'root')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    DB_NAME = os.getenv('DB_NAME', 'yolo_detections')
+    # 0 = keep all partitions
+    DB_RETENTION_DAYS = int(os.getenv('DB_RETENTION_DAYS', '0'))
+    
+    try:
+        connection = mysql.connector.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            use_pure=USE_PURE
+        )
+        cursor = connection.cursor()
+        
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'detections' AND PARTITION_NAME IS NOT NULL",
+            (DB_NAME,)
+        )
+        partitions = {row[0] for row in cursor.fetchall()}
+        if 'p_future' not in partitions:
+            print("detections is not partitioned; recreate it with create_database() to enable rotation")
+            cursor.close()
+            connection.close()
+            return
+        
+        today = date.today()
+        daily = sorted(name for name in partitions if name[1:].isdigit())
+        if not daily and 'p_hist' not in partitions:
+            # Rotasi pertama: riwayat lama ke p_hist, supaya partisi hari ini hanya berisi hari ini
+            # dan bisa di-drop sesuai retensi. Menyalin seluruh baris p_future (sekali saja)
+            print("First rotation: moving existing rows into p_hist (copies p_future rows)...")
+            cursor.execute(
+                f"ALTER TABLE detections REORGANIZE PARTITION p_future INTO ("
+                f"PARTITION p_hist VALUES LESS THAN (UNIX_TIMESTAMP('{today:%Y-%m-%d} 00:00:00')), "
+                f"PARTITION p_future VALUES LESS THAN MAXVALUE)"
+            )
+        
+        # Partisi pYYYYMMDD berisi baris dengan timestamp < hari berikutnya 00:00
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            name = f"p{day:%Y%m%d}"
+            if name in partitions:
+                continue
+            upper = day + timedelta(days=1)
+            print(f"Adding partition {name}...")
+            cursor.execute(
+                f"ALTER TABLE detections REORGANIZE PARTITION p_future INTO ("
+                f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00')), "
+                f"PARTITION p_future VALUES LESS THAN MAXVALUE)"
+            )
+        
+        if DB_RETENTION_DAYS > 0:
+            cutoff = today - timedelta(days=DB_RETENTION_DAYS)
+            expired = []
+            for name in sorted(partitions):
+                try:
+                    day = datetime.strptime(name, "p%Y%m%d").date()
+                except ValueError:
+                    continue
+                if day < cutoff:
+                    expired.append(name)
+            # p_hist hanya berisi baris sebelum partisi harian pertama
+            if 'p_hist' in partitions and daily and daily[0] in expired:
+                expired.insert(0, 'p_hist')
+            if expired:
+                # DROP PARTITION hanya operasi metadata, tanpa scan baris
+                print(f"Dropping expired partitions: {', '.join(expired)}")
+                cursor.execute(f"ALTER TABLE detections DROP PARTITION {', '.join(expired)}")
+        
+        print("Partition rotation completed")
+        cursor.close()
+        connection.close()
+        
+    except Exception as e:
+        print(f"Partition rotation failed: {e}")
+        sys.exit(1)
+
+def bulk_load_csv(path: str):
+    """Backfill detections from a CSV file with LOAD DATA LOCAL INFILE
+
+    CSV columns: camera_id,frame_seq,label,confidence,bbox_x_center,bbox_y_center,bbox_width,bbox_height[,timestamp]
+    (no header). The optional 9th column is the original detection time ('YYYY-MM-DD HH:MM:SS');
+    rows without it get the load time. The MySQL server must allow it: start mysqld with
+    --local-infile=1 or run `SET GLOBAL local_infile = 1`.
+    """
+    
+    DB_HOST = os.getenv('DB_HOST', 'localhost')
+    DB_PORT = int(os.getenv('DB_PORT', '3307'))
+    DB_USER = os.getenv('DB_USER', 'root')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    DB_NAME = os.getenv('DB_NAME', 'yolo_detections')
+    
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        print(f"CSV file not found: {path}")
+        sys.exit(1)
+    
+    try:
+        connection = mysql.connector.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            allow_local_infile=True,
+            use_pure=USE_PURE
+        )
+        cursor = connection.cursor()
+        
+        # Server mem-parse CSV langsung, tanpa parsing SQL per baris. Timestamp asli dipakai supaya
+        # baris backfill masuk ke partisi harinya, bukan partisi hari ini
+        print(f"Loading {path} into detections...")
+        cursor.execute(
+            "LOAD DATA LOCAL INFILE %s INTO TABLE detections "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            "(camera_id, frame_seq, label, confidence, bbox_x_center, bbox_y_center, bbox_width, bbox_height, @ts) "
+            "SET timestamp = COALESCE(NULLIF(@ts, ''), CURRENT_TIMESTAMP)",
+            (path,)
+        )
+        connection.commit()
+        print(f"Loaded {cursor.rowcount} detections")
+        
+        cursor.close()
+        connection.close()
+        
+    except Exception as e:
+        print(f"Bulk load failed: {e}")
+        sys.exit(1)
+
 def test_connection():
     """Test database connection"""
     
@@ -139,7 +344,8 @@ def test_connection():
             port=DB_PORT,
             user=DB_USER,
             password=DB_PASSWORD,
-            database=DB_NAME
+            database=DB_NAME,
+            use_pure=USE_PURE
         )
         
         cursor = connection.cursor()
@@ -156,7 +362,19 @@ def test_connection():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Usage:
+    #   python init_database.py                 -> phase 1: create database, tables and view
+    #   python init_database.py create_indexes  -> phase 2: add idx_label / idx_confidence after backfill
+    #   python init_database.py rotate_partitions -> daily: add upcoming day partitions, drop expired
+    #   python init_database.py bulk_load FILE.csv -> backfill detections via LOAD DATA LOCAL INFILE
+    #   python init_database.py test            -> test connection
     if len(sys.argv) > 1 and sys.argv[1] == "test":
         test_connection()
+    elif len(sys.argv) > 1 and sys.argv[1] == "create_indexes":
+        create_indexes()
+    elif len(sys.argv) > 1 and sys.argv[1] == "rotate_partitions":
+        rotate_partitions()
+    elif len(sys.argv) > 2 and sys.argv[1] == "bulk_load":
+        bulk_load_csv(sys.argv[2])
     else:
         create_database()